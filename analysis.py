@@ -0,0 +1,142 @@
+"""
+Multi-PV analysis of a position on top of the minimax search.
+
+    analyzer = Analyzer()
+    result = analyzer.analyze(board, "B", depth=6)      # or time_limit=2.0
+    for move, score, pv in result.lines: ...
+
+Every legal move is searched with a full window, so each one gets an
+exact score (from the point of view of the side to move) and its own
+principal variation, where None stands for a pass. Lines come back best
+first.
+
+Results go into an LRU cache keyed by (position key, side, depth). A
+request at a depth already analysed, or below one, is answered from the
+cache. A deeper request deepens iteratively from the deepest cached
+analysis, searching moves in its order and following its variations
+first. With a time limit, the search deepens until the time runs out and
+returns the last depth it completed.
+"""
+
+import time
+from collections import OrderedDict, namedtuple
+
+import bitboard
+import board as board_engine
+from minimax_ai import MinimaxAgent, SearchTimeout
+
+MAX_DEPTH = 64
+
+Analysis = namedtuple("Analysis", "depth lines")
+Line = namedtuple("Line", "move score pv")
+
+
+class Analyzer:
+    def __init__(self, engine=bitboard, cache_size=1024, tt_size=1 << 18, evaluator=None):
+        """
+        Args:
+            engine: Board engine of the positions analysed
+            cache_size: Analyses kept in the LRU cache
+            tt_size: Transposition table size (shared by both colours)
+            evaluator: Position evaluator (None: the default pattern evaluator)
+        """
+        self.engine = engine
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (key, color, depth) -> Analysis
+        self.agents = {color: MinimaxAgent(color, engine=engine, search="alphabeta",
+                                           tt_size=tt_size, evaluator=evaluator)
+                       for color in ("B", "W")}
+        self.agents["W"].tt = self.agents["B"].tt  # negamax scores are side-relative
+        self.stats = {}
+
+    def analyze(self, board, color, depth=None, time_limit=None):
+        """
+        Score every legal move of `color` in board.
+
+        Args:
+            board: Position (not modified)
+            color: Side to move ('B' or 'W')
+            depth: Search depth, the move itself included
+            time_limit: Seconds available (with no depth: deepen until then)
+
+        Returns:
+            Analysis(depth, lines): the depth reached and a list of
+            Line(move, score, pv), best first
+        """
+        if depth is None and time_limit is None:
+            raise ValueError("analyze needs a depth or a time limit")
+        start = time.perf_counter()
+        black, white = self.engine.count_pieces(board)
+        max_depth = max(1, min(depth or MAX_DEPTH, 64 - black - white))
+        key = self.engine.zobrist_hash(board, color)
+        self.stats = {"cache_hit": False, "nodes": 0}
+
+        hit = self.lookup(key, color, max_depth)
+        if hit is not None:
+            self.stats.update(cache_hit=True, depth=hit.depth, time=time.perf_counter() - start)
+            return hit
+
+        moves = self.engine.valid_moves(board, color)
+        best = self.lookup_below(key, color, max_depth)
+        if not moves:
+            return Analysis(max_depth, [])
+
+        agent = self.agents[color]
+        agent.reset_search(time_limit)
+        first = 1 if best is None else best.depth + 1
+        pvs = None
+        if best is not None:
+            moves = [line.move for line in best.lines]
+            pvs = {line.move: line.pv for line in best.lines}
+        for d in range(first, max_depth + 1):
+            try:
+                lines = agent.score_moves(board, moves, d, pvs)
+            except SearchTimeout:
+                break
+            best = Analysis(d, [Line(*line) for line in lines])
+            self.store(key, color, best)
+            moves = [line.move for line in best.lines]
+            pvs = {line.move: line.pv for line in best.lines}
+            if agent.deadline is not None and time.perf_counter() >= agent.deadline:
+                break
+
+        if best is None:
+            # Not even depth 1 in time: legal moves, unscored
+            best = Analysis(0, [Line(move, None, [move]) for move in moves])
+        self.stats.update(nodes=agent.nodes, depth=best.depth, time=time.perf_counter() - start)
+        return best
+
+    def lookup(self, key, color, depth):
+        """Cached analysis of the position at `depth` or deeper, or None."""
+        for d in range(MAX_DEPTH, depth - 1, -1):
+            analysis = self.cache.get((key, color, d))
+            if analysis is not None:
+                self.cache.move_to_end((key, color, d))
+                return analysis
+        return None
+
+    def lookup_below(self, key, color, depth):
+        """Deepest cached analysis of the position shallower than `depth`, or None."""
+        for d in range(depth - 1, 0, -1):
+            analysis = self.cache.get((key, color, d))
+            if analysis is not None:
+                self.cache.move_to_end((key, color, d))
+                return analysis
+        return None
+
+    def store(self, key, color, analysis):
+        self.cache[(key, color, analysis.depth)] = analysis
+        self.cache.move_to_end((key, color, analysis.depth))
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+
+_analyzers = {}  # engine name -> Analyzer used by analyze()
+
+
+def analyze(board, color, depth=None, time_limit=None):
+    """Analyzer.analyze with a module-level analyzer (one per engine, so one cache)."""
+    engine = bitboard if isinstance(board[0], int) else board_engine
+    if engine.__name__ not in _analyzers:
+        _analyzers[engine.__name__] = Analyzer(engine)
+    return _analyzers[engine.__name__].analyze(board, color, depth, time_limit)
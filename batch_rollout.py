@@ -0,0 +1,162 @@
+"""
+Batched random playouts for the MCTS agents.
+
+playouts() takes K positions (the same leaf K times, or several leaves)
+and plays a random game from each one, all in lockstep. The K games are
+packed side by side in two wide ints (side to move, other side), one
+bitboard lane per game (see bitboard.LANE), so each ply generates the
+moves of every game with one moves_mask-style pass over the wide ints,
+and flips every game's chosen move with one more. The only per-game work
+left in Python is picking the random move. There are no board copies, no
+(x, y) move lists and no undo stack. A game that finishes keeps its lane
+(with no move for either side it no longer changes) but drops out of the
+per-game loop.
+
+numpy is not a dependency of the project; Python's big ints play the
+part of the vector registers, as in pattern_eval.mobility.
+"""
+
+import random
+
+from bitboard import FULL, LANE, SIDE, lane_masks, from_board
+
+_lane_masks = {}  # games -> bitboard.lane_masks(games)
+
+
+def _masks(games):
+    if games not in _lane_masks:
+        _lane_masks[games] = lane_masks(games)
+    return _lane_masks[games]
+
+
+def lane_moves(own, opp, full, left, right):
+    """bitboard.moves_mask of every lane at once."""
+    empty = ~(own | opp) & full
+    moves = 0
+    for n, mask in left:
+        m = opp & mask
+        x = (own << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        moves |= (x << n) & mask & empty
+    for n, mask in right:
+        m = opp & mask
+        x = (own >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        moves |= (x >> n) & mask & empty
+    return moves
+
+
+def lane_flips(own, opp, played, left, right):
+    """
+    Discs flipped in every lane by the move of that lane in `played` (at
+    most one square per lane). In each direction, a flipped disc is reached
+    both from the move and from one of own's discs through opponent discs.
+    """
+    flips = 0
+    # LEFT_SHIFTS[i] and RIGHT_SHIFTS[i] are opposite directions
+    for (n, lmask), (_, rmask) in zip(left, right):
+        lm, rm = opp & lmask, opp & rmask
+        x = (played << n) & lm
+        x |= (x << n) & lm
+        x |= (x << n) & lm
+        x |= (x << n) & lm
+        x |= (x << n) & lm
+        x |= (x << n) & lm
+        y = (own >> n) & rm
+        y |= (y >> n) & rm
+        y |= (y >> n) & rm
+        y |= (y >> n) & rm
+        y |= (y >> n) & rm
+        y |= (y >> n) & rm
+        flips |= x & y
+        x = (played >> n) & rm
+        x |= (x >> n) & rm
+        x |= (x >> n) & rm
+        x |= (x >> n) & rm
+        x |= (x >> n) & rm
+        x |= (x >> n) & rm
+        y = (own << n) & lm
+        y |= (y << n) & lm
+        y |= (y << n) & lm
+        y |= (y << n) & lm
+        y |= (y << n) & lm
+        y |= (y << n) & lm
+        flips |= x & y
+    return flips
+
+
+def playouts(boards, colors, rng=random):
+    """
+    Play a random game to the end from each position.
+
+    Args:
+        boards: Boards of either engine (not modified)
+        colors: Side to move in each board ('B' or 'W')
+        rng: Random source (the random module by default)
+
+    Returns:
+        The final disc difference (black - white) of each game
+    """
+    games = len(boards)
+    full, left, right = _masks(games)
+    own = opp = 0
+    black_to_move = []
+    for i, (board, color) in enumerate(zip(boards, colors)):
+        bits = board if isinstance(board[0], int) else from_board(board)
+        me = SIDE[color]
+        own |= bits[me] << LANE * i
+        opp |= bits[1 - me] << LANE * i
+        black_to_move.append(color == "B")
+    passed = [False] * games
+    results = [0] * games
+    randrange = rng.randrange
+
+    active = list(range(games))
+    while active:
+        moves = lane_moves(own, opp, full, left, right)
+        played = 0
+        running = []
+        for i in active:
+            shift = LANE * i
+            lane = moves >> shift & FULL
+            if lane:
+                # Drop a random number of low bits, then play the lowest one
+                for _ in range(randrange(lane.bit_count())):
+                    lane &= lane - 1
+                played |= (lane & -lane) << shift
+                passed[i] = False
+            elif passed[i]:
+                # Both sides passed: game over
+                diff = (own >> shift & FULL).bit_count() - (opp >> shift & FULL).bit_count()
+                results[i] = diff if black_to_move[i] else -diff
+                continue
+            else:
+                passed[i] = True
+            black_to_move[i] = not black_to_move[i]
+            running.append(i)
+        active = running
+        flips = lane_flips(own, opp, played, left, right)
+        own, opp = opp & ~flips, own | flips | played
+
+    return results
+
+
+def leaf_wins(board, color, count, player, draw=0.5, rng=random):
+    """
+    Total result for player of count playouts from one position: 1 per win,
+    draw per draw, 0 per loss.
+    """
+    sign = 1 if player == "B" else -1
+    total = 0
+    for diff in playouts([board] * count, [color] * count, rng):
+        diff *= sign
+        total += 1 if diff > 0 else draw if diff == 0 else 0
+    return total
@@ -0,0 +1,276 @@
+"""
+Benchmarks for the board engines and the agents.
+
+    python benchmark.py [--quick] [--strength GAMES] [--output results.json]
+
+Results are printed as one JSON object (and optionally written to a file)
+so runs on different commits can be compared key by key. --strength also
+plays matches (slow) comparing agent variants at equal budgets.
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import bitboard
+import board
+import board_Romain
+from main import ENGINES, play_game, iter_games
+from lockstep import play_games
+from batch_rollout import leaf_wins
+from random_ai import RandomAgent
+from minimax_ai import MinimaxAgent
+from mcts_ai import MCTSAgent
+from mcts_ai_Romain import MCTSAgentRomain
+
+PERFT_ENGINES = {"list": board, "bitboard": bitboard, "romain": board_Romain}
+
+# Leaf counts from the start position, a pass counting as one ply
+KNOWN_PERFT = {1: 4, 2: 12, 3: 56, 4: 244, 5: 1396, 6: 8200, 7: 55092,
+               8: 390216, 9: 3005288, 10: 24571284}
+
+
+def perft(engine, position, color, depth, passed=False):
+    """Number of leaves `depth` plies below position."""
+    if depth == 0:
+        return 1
+    other = "W" if color == "B" else "B"
+    moves = engine.valid_moves(position, color)
+    if not moves:
+        if passed:
+            return 1  # game over before depth
+        return perft(engine, position, other, depth - 1, True)
+    leaves = 0
+    undo = getattr(engine, "undo_move", None)
+    for move in moves:
+        if undo is not None:
+            flipped = engine.make_move(position, color, *move)
+            leaves += perft(engine, position, other, depth - 1)
+            undo(position, color, *move, flipped)
+        else:
+            child = copy.deepcopy(position)
+            engine.make_move(child, color, *move)
+            leaves += perft(engine, child, other, depth - 1)
+    return leaves
+
+
+def perft_bench(engine, depth):
+    start = time.perf_counter()
+    leaves = perft(engine, engine.create_board(), "B", depth)
+    elapsed = time.perf_counter() - start
+    return {"depth": depth, "leaves": leaves, "ok": leaves == KNOWN_PERFT.get(depth),
+            "seconds": elapsed, "leaves_per_second": leaves / elapsed}
+
+
+def sample_positions(engine, count=4, seed=0):
+    """Start position plus a few positions reached by random play."""
+    rng = random.Random(seed)
+    positions = [(engine.create_board(), "B")]
+    while len(positions) < count:
+        position, color = engine.create_board(), "B"
+        for _ in range(rng.randint(8, 30)):
+            moves = engine.valid_moves(position, color)
+            if moves:
+                engine.make_move(position, color, *rng.choice(moves))
+            color = "W" if color == "B" else "B"
+        if engine.valid_moves(position, color):
+            positions.append((position, color))
+    return positions
+
+
+def random_games(engine, n_games=200, seed=0):
+    """Play n_games RandomAgent games on `engine`, return games per second."""
+    random.seed(seed)
+    start = time.perf_counter()
+    for _ in range(n_games):
+        play_game(RandomAgent("B", engine=engine), RandomAgent("W", engine=engine), engine=engine)
+    return n_games / (time.perf_counter() - start)
+
+
+def lockstep_games(name, n_games=200, batch_size=256):
+    """Games per second of play_games (lockstep, batched get_moves), `name` against itself."""
+    start = time.perf_counter()
+    play_games((name, {}), (name, {}), n_games, batch_size)
+    return n_games / (time.perf_counter() - start)
+
+
+def minimax_nodes(engine, depth=4):
+    """Nodes per second of the alpha-beta MinimaxAgent on the sample positions."""
+    nodes, elapsed = 0, 0.0
+    for position, color in sample_positions(engine):
+        agent = MinimaxAgent(color, depth=depth, engine=engine, search="alphabeta")
+        start = time.perf_counter()
+        agent.get_move(position)
+        elapsed += time.perf_counter() - start
+        nodes += agent.stats["nodes"]
+    return {"depth": depth, "nodes": nodes, "nodes_per_second": nodes / elapsed}
+
+
+def minimax_speedup(depth=5, worker_counts=(1, 2), positions=6):
+    """Fixed-depth alpha-beta time on the sample positions for each worker count."""
+    results = {}
+    for workers in worker_counts:
+        elapsed, nodes = 0.0, 0
+        for position, color in sample_positions(bitboard, positions):
+            agent = MinimaxAgent(color, depth=depth, engine=bitboard, search="alphabeta",
+                                 workers=workers)
+            if workers > 1:
+                # Start the processes outside the timing (their tables stay empty)
+                agent.pool = ProcessPoolExecutor(max_workers=workers)
+                list(agent.pool.map(abs, range(workers)))
+            start = time.perf_counter()
+            agent.get_move(position)
+            elapsed += time.perf_counter() - start
+            nodes += agent.stats["nodes"]
+            agent.close()
+        results[workers] = {"seconds": elapsed, "nodes": nodes}
+    for result in results.values():
+        result["speedup"] = results[worker_counts[0]]["seconds"] / result["seconds"]
+    return {"depth": depth, "workers": results}
+
+
+def mcts_rollouts(agent_class, engine, simulations=500, seed=0, batch=1):
+    """Rollouts per second of an MCTS agent on the sample positions."""
+    random.seed(seed)
+    total, elapsed = 0, 0.0
+    for position, color in sample_positions(engine):
+        agent = agent_class(color, simulations, engine=engine, batch=batch, early_stop=False)
+        start = time.perf_counter()
+        agent.get_move(position)
+        elapsed += time.perf_counter() - start
+        total += agent.stats.get("rollouts", 0)
+    return total / elapsed
+
+
+def rollouts_agree(engine, seed=0):
+    """
+    Whether MCTSAgent.rollout and the batched playouts play the same game
+    (same passes, same end) from every sample position on a shared seed.
+    """
+    for i, (position, color) in enumerate(sample_positions(engine, 16, seed)):
+        agent = MCTSAgent(color, engine=engine)
+        agent.rng = random.Random(seed + i)
+        single = agent.rollout(position, color)
+        if single != leaf_wins(position, color, 1, color, draw=0, rng=random.Random(seed + i)):
+            return False
+    return True
+
+
+def mcts_simulations(workers, simulations=2000, seed=0):
+    """Simulations per second of a root-parallel MCTSAgent from the start position."""
+    random.seed(seed)
+    agent = MCTSAgent("B", simulations=simulations, engine=bitboard, workers=workers,
+                      merge_symmetric=False, early_stop=False)
+    agent.get_move(bitboard.create_board())  # start the worker processes
+    start = time.perf_counter()
+    agent.get_move(bitboard.create_board())
+    elapsed = time.perf_counter() - start
+    agent.close()
+    return simulations / elapsed
+
+
+def mcts_bytes_per_node(storage, simulations=1000, seed=0):
+    """Memory held by an MCTSAgent tree after one search, per node."""
+    random.seed(seed)
+    agent = MCTSAgent("B", engine=bitboard, storage=storage)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tree = agent.search_arrays(bitboard.create_board(), simulations) if storage == "arrays" \
+        else agent.search(bitboard.create_board(), simulations)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    if storage == "arrays":
+        return used / len(tree)
+    nodes, stack = 0, [tree]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        stack.extend(node.children)
+    return used / nodes
+
+
+def match(spec_a, spec_b, n_games, seed=0):
+    """Points of A per game against B (1 win, 0.5 draw), colours alternating."""
+    points = 0.0
+    for _, score_a, score_b in iter_games(spec_a, spec_b, n_games, seed=seed, engine="bitboard"):
+        points += 1 if score_a > score_b else 0.5 if score_a == score_b else 0
+    return points / n_games
+
+
+def rave_strength(n_games=20, simulations=200, time_limit=0.2, k=300):
+    """Score of RAVE against plain UCB1 for both MCTS agents, at equal simulations and time."""
+    results = {}
+    for name, budget in (("mcts", "simulations"), ("mcts_romain", "iterations")):
+        results[name] = {
+            "equal_simulations": match((name, {budget: simulations, "rave": k}),
+                                       (name, {budget: simulations}), n_games),
+            "equal_time": match((name, {budget: None, "time_limit": time_limit, "rave": k}),
+                                (name, {budget: None, "time_limit": time_limit}), n_games)}
+    results.update(games=n_games, simulations=simulations, time_limit=time_limit, k=k)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick=False, strength_games=0):
+    scale = 4 if quick else 1
+    results = {"commit": git_commit(), "python": platform.python_version(),
+               "cpu_count": os.cpu_count(), "quick": quick}
+
+    perft_depth = 5 if quick else 6
+    results["perft"] = {name: perft_bench(engine, perft_depth)
+                        for name, engine in PERFT_ENGINES.items()}
+    results["random_games_per_second"] = {name: random_games(engine, 200 // scale)
+                                          for name, engine in ENGINES.items()}
+    results["lockstep_games_per_second"] = {name: lockstep_games(name, 200 // scale)
+                                            for name in ("random", "greedy")}
+    results["minimax_alphabeta"] = {name: minimax_nodes(engine, 3 if quick else 4)
+                                    for name, engine in ENGINES.items()}
+    results["minimax_parallel_speedup"] = minimax_speedup(
+        4 if quick else 5, tuple(sorted({1, 2, os.cpu_count() or 1})))
+    results["mcts_rollouts_per_second"] = {
+        name: {"MCTSAgent": mcts_rollouts(MCTSAgent, engine, 400 // scale),
+               "MCTSAgentRomain": mcts_rollouts(MCTSAgentRomain, engine, 400 // scale)}
+        for name, engine in ENGINES.items()}
+    results["mcts_rollouts_agree"] = {name: rollouts_agree(engine)
+                                      for name, engine in ENGINES.items()}
+    results["mcts_batched_rollouts_per_second"] = {
+        batch: mcts_rollouts(MCTSAgent, bitboard, 400 // scale // batch, batch=batch)
+        for batch in (1, 8, 32)}
+    results["mcts_parallel_simulations_per_second"] = {
+        workers: mcts_simulations(workers, 2000 // scale)
+        for workers in sorted({1, 2, os.cpu_count() or 1})}
+    results["mcts_bytes_per_node"] = {storage: mcts_bytes_per_node(storage, 1000 // scale)
+                                      for storage in ("nodes", "arrays")}
+    if strength_games:
+        results["rave_score"] = rave_strength(strength_games)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Othello engine and agent benchmarks")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads")
+    parser.add_argument("--strength", type=int, default=0, metavar="GAMES",
+                        help="also play GAMES games per strength comparison")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = run(args.quick, args.strength)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
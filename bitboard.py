@@ -0,0 +1,192 @@
+"""
+Bitboard engine for Othello.
+
+Same contract as board.py (create_board / valid_moves / make_move /
+undo_move / count_pieces) but each side is packed into a 64-bit integer.
+Square (x, y) is bit x * 8 + y, so moves come back in the same order as
+board.py.
+A board is a mutable list [black_bits, white_bits].
+"""
+
+from board import EMPTY, BLACK, WHITE, BOARD_SIZE, ZOBRIST, ZOBRIST_SIDE
+
+FULL = (1 << 64) - 1
+NOT_COL_0 = 0xFEFEFEFEFEFEFEFE  # y != 0
+NOT_COL_7 = 0x7F7F7F7F7F7F7F7F  # y != 7
+
+# (amount, mask): left shifts move towards higher square indices
+LEFT_SHIFTS = [(1, NOT_COL_0),    # (0, +1)
+               (8, FULL),         # (+1, 0)
+               (9, NOT_COL_0),    # (+1, +1)
+               (7, NOT_COL_7)]    # (+1, -1)
+RIGHT_SHIFTS = [(1, NOT_COL_7),   # (0, -1)
+                (8, FULL),        # (-1, 0)
+                (9, NOT_COL_7),   # (-1, -1)
+                (7, NOT_COL_0)]   # (-1, +1)
+
+SIDE = {BLACK: 0, WHITE: 1}
+
+# Several boards side by side in one int, board i from bit LANE * i. A shift
+# (9 at most) pushes bits into the 16 spare bits of a lane, never into the
+# next board, and the lane masks clear them
+LANE = 80
+
+# Flipping a disc swaps its black key for its white key
+FLIP_KEYS = [ZOBRIST[BLACK][sq] ^ ZOBRIST[WHITE][sq] for sq in range(64)]
+
+
+def create_board():
+    board = [0, 0]
+    board[0] = (1 << (3 * 8 + 4)) | (1 << (4 * 8 + 3))
+    board[1] = (1 << (3 * 8 + 3)) | (1 << (4 * 8 + 4))
+    return board
+
+
+def opponent(player):
+    return BLACK if player == WHITE else WHITE
+
+
+# Squares as binary digits, for from_board
+BLACK_DIGITS = str.maketrans({BLACK: "1", WHITE: "0", EMPTY: "0"})
+WHITE_DIGITS = str.maketrans({BLACK: "0", WHITE: "1", EMPTY: "0"})
+
+
+def from_board(rows):
+    """Convert a board.py 8x8 list board to a bitboard."""
+    squares = "".join(map("".join, rows))[::-1]  # square 63 first: the most significant digit
+    return [int(squares.translate(BLACK_DIGITS), 2), int(squares.translate(WHITE_DIGITS), 2)]
+
+
+def to_board(board):
+    """Convert a bitboard back to a board.py 8x8 list board."""
+    return [[piece_at(board, x, y) for y in range(BOARD_SIZE)]
+            for x in range(BOARD_SIZE)]
+
+
+def piece_at(board, x, y):
+    bit = 1 << (x * 8 + y)
+    if board[0] & bit:
+        return BLACK
+    if board[1] & bit:
+        return WHITE
+    return EMPTY
+
+
+def moves_mask(own, opp):
+    """Bitmask of legal squares for the side owning `own`."""
+    empty = ~(own | opp) & FULL
+    moves = 0
+    for n, mask in LEFT_SHIFTS:
+        m = opp & mask
+        x = (own << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        moves |= (x << n) & mask & empty
+    for n, mask in RIGHT_SHIFTS:
+        m = opp & mask
+        x = (own >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        moves |= (x >> n) & mask & empty
+    return moves
+
+
+def lane_masks(lanes):
+    """FULL, LEFT_SHIFTS and RIGHT_SHIFTS with their masks repeated in `lanes` lanes."""
+    spread = sum(1 << LANE * i for i in range(lanes))
+    return (FULL * spread, [(n, mask * spread) for n, mask in LEFT_SHIFTS],
+            [(n, mask * spread) for n, mask in RIGHT_SHIFTS])
+
+
+def flips_mask(own, opp, sq):
+    """Bitmask of the discs flipped by playing on square index `sq`."""
+    bit = 1 << sq
+    flips = 0
+    for n, mask in LEFT_SHIFTS:
+        line = 0
+        x = (bit << n) & mask
+        while x & opp:
+            line |= x
+            x = (x << n) & mask
+        if x & own:
+            flips |= line
+    for n, mask in RIGHT_SHIFTS:
+        line = 0
+        x = (bit >> n) & mask
+        while x & opp:
+            line |= x
+            x = (x >> n) & mask
+        if x & own:
+            flips |= line
+    return flips
+
+
+def squares(mask):
+    """List the (x, y) squares set in `mask`, lowest index first."""
+    result = []
+    while mask:
+        lsb = mask & -mask
+        i = lsb.bit_length() - 1
+        result.append((i >> 3, i & 7))
+        mask ^= lsb
+    return result
+
+
+def is_valid_move(board, player, x, y):
+    me = SIDE[player]
+    return bool(moves_mask(board[me], board[1 - me]) & (1 << (x * 8 + y)))
+
+
+def valid_moves(board, player):
+    me = SIDE[player]
+    return squares(moves_mask(board[me], board[1 - me]))
+
+
+def make_move(board, player, x, y):
+    me = SIDE[player]
+    sq = x * 8 + y
+    flips = flips_mask(board[me], board[1 - me], sq)
+    board[me] |= flips | (1 << sq)
+    board[1 - me] &= ~flips
+    return flips
+
+
+def undo_move(board, player, x, y, flips):
+    """Reverse make_move given the flip mask it returned."""
+    me = SIDE[player]
+    board[me] &= ~(flips | (1 << (x * 8 + y)))
+    board[1 - me] |= flips
+
+
+def zobrist_hash(board, player):
+    """Same keys as board.zobrist_hash for the same position."""
+    key = ZOBRIST_SIDE if player == WHITE else 0
+    for side, color in ((0, BLACK), (1, WHITE)):
+        keys = ZOBRIST[color]
+        bits = board[side]
+        while bits:
+            lsb = bits & -bits
+            key ^= keys[lsb.bit_length() - 1]
+            bits ^= lsb
+    return key
+
+
+def zobrist_move(key, player, x, y, flips):
+    """Key after make_move, from the flip mask it returned."""
+    sq = x * 8 + y
+    key ^= ZOBRIST[player][sq] ^ ZOBRIST_SIDE
+    while flips:
+        lsb = flips & -flips
+        key ^= FLIP_KEYS[lsb.bit_length() - 1]
+        flips ^= lsb
+    return key
+
+
+def count_pieces(board):
+    return board[0].bit_count(), board[1].bit_count()
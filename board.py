@@ -1,10 +1,22 @@
+import random
+
 EMPTY, BLACK, WHITE = ".", "B", "W"
 BOARD_SIZE = 8
 DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1),
               (0, -1),         (0, 1),
               (1, -1), (1, 0), (1, 1)]
 
+# Clés de Zobrist (graine fixe : les clés sont les mêmes d'un processus à l'autre)
+_zobrist_rng = random.Random(20240411)
+ZOBRIST = {BLACK: [_zobrist_rng.getrandbits(64) for _ in range(BOARD_SIZE * BOARD_SIZE)],
+           WHITE: [_zobrist_rng.getrandbits(64) for _ in range(BOARD_SIZE * BOARD_SIZE)]}
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)  # présent quand c'est à Blanc de jouer
+
 def create_board():
+    return Board()
+
+def create_rows():
+    # Position de départ en simple liste de lignes (sans Board)
     board = [[EMPTY for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
     board[3][3], board[4][4] = WHITE, WHITE
     board[3][4], board[4][3] = BLACK, BLACK
@@ -16,7 +28,114 @@ def opponent(player):
 def on_board(x, y):
     return 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE
 
-def is_valid_move(board, player, x, y):
+# NEIGHBOURS[x][y] : cases voisines de (x, y) sur le plateau
+NEIGHBOURS = [[[(x + dx, y + dy) for dx, dy in DIRECTIONS if on_board(x + dx, y + dy)]
+               for y in range(BOARD_SIZE)] for x in range(BOARD_SIZE)]
+
+class Board:
+    # Plateau 8x8 qui tient à jour, coup après coup, le nombre de pions, la
+    # liste des cases vides et la frontière (cases vides voisines d'un pion) :
+    # un coup valide est toujours sur la frontière.
+    # Il se lit comme une liste de lignes (board[x][y], for row in board) mais
+    # ne se modifie que par make_move / undo_move.
+    # touching[x][y] : nombre de pions voisins de (x, y), pour tenir la frontière
+    __slots__ = ("rows", "black", "white", "empties", "frontier", "touching")
+
+    def __init__(self, rows=None):
+        rows = create_rows() if rows is None else [list(row) for row in rows]
+        self.rows = rows
+        self.black = sum(row.count(BLACK) for row in rows)
+        self.white = sum(row.count(WHITE) for row in rows)
+        self.empties = [(x, y) for x in range(BOARD_SIZE) for y in range(BOARD_SIZE)
+                        if rows[x][y] == EMPTY]
+        self.touching = [[sum(rows[nx][ny] != EMPTY for nx, ny in NEIGHBOURS[x][y])
+                          for y in range(BOARD_SIZE)] for x in range(BOARD_SIZE)]
+        self.frontier = {(x, y) for x, y in self.empties if self.touching[x][y]}
+
+    def __getitem__(self, x):
+        return self.rows[x]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return BOARD_SIZE
+
+    def __eq__(self, other):
+        return self.rows == (other.rows if isinstance(other, Board) else other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Board(%r)" % (self.rows,)
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.rows = [row[:] for row in self.rows]
+        board.black = self.black
+        board.white = self.white
+        board.empties = self.empties[:]
+        board.frontier = set(self.frontier)
+        board.touching = [row[:] for row in self.touching]
+        return board
+
+    def count_pieces(self):
+        return self.black, self.white
+
+    def is_valid_move(self, player, x, y):
+        return (x, y) in self.frontier and _is_valid_move(self.rows, player, x, y)
+
+    def valid_moves(self, player):
+        # Seules les cases de la frontière sont testées ; tri pour garder
+        # l'ordre de valid_moves sur une liste de lignes
+        rows = self.rows
+        return sorted(move for move in self.frontier if _is_valid_move(rows, player, *move))
+
+    def make_move(self, player, x, y):
+        rows = self.rows
+        flipped = _make_move(rows, player, x, y)
+        if player == BLACK:
+            self.black += len(flipped) + 1
+            self.white -= len(flipped)
+        else:
+            self.white += len(flipped) + 1
+            self.black -= len(flipped)
+        self.empties.remove((x, y))
+        frontier = self.frontier
+        touching = self.touching
+        frontier.discard((x, y))
+        for nx, ny in NEIGHBOURS[x][y]:
+            touching[nx][ny] += 1
+            if rows[nx][ny] == EMPTY:
+                frontier.add((nx, ny))
+        return flipped
+
+    def undo_move(self, player, x, y, flipped):
+        rows = self.rows
+        _undo_move(rows, player, x, y, flipped)
+        if player == BLACK:
+            self.black -= len(flipped) + 1
+            self.white += len(flipped)
+        else:
+            self.white -= len(flipped) + 1
+            self.black += len(flipped)
+        self.empties.append((x, y))
+        frontier = self.frontier
+        touching = self.touching
+        if touching[x][y]:
+            frontier.add((x, y))
+        # Les voisins vides ne restent sur la frontière que s'ils touchent un autre pion
+        for nx, ny in NEIGHBOURS[x][y]:
+            touching[nx][ny] -= 1
+            if not touching[nx][ny] and rows[nx][ny] == EMPTY:
+                frontier.discard((nx, ny))
+
+# Les fonctions acceptent un Board ou une simple liste de lignes
+
+def _is_valid_move(board, player, x, y):
     if board[x][y] != EMPTY:
         return False
     opp = opponent(player)
@@ -31,14 +150,22 @@ def is_valid_move(board, player, x, y):
             return True
     return False
 
+def is_valid_move(board, player, x, y):
+    if isinstance(board, Board):
+        return board.is_valid_move(player, x, y)
+    return _is_valid_move(board, player, x, y)
+
 def valid_moves(board, player):
+    if isinstance(board, Board):
+        return board.valid_moves(player)
     return [(x, y) for x in range(BOARD_SIZE)
                    for y in range(BOARD_SIZE)
-                   if is_valid_move(board, player, x, y)]
+                   if _is_valid_move(board, player, x, y)]
 
-def make_move(board, player, x, y):
+def _make_move(board, player, x, y):
     board[x][y] = player
     opp = opponent(player)
+    flipped = []
     for dx, dy in DIRECTIONS:
         nx, ny = x + dx, y + dy
         to_flip = []
@@ -49,8 +176,47 @@ def make_move(board, player, x, y):
         if on_board(nx, ny) and board[nx][ny] == player:
             for fx, fy in to_flip:
                 board[fx][fy] = player
+            flipped.extend(to_flip)
+    return flipped
+
+def make_move(board, player, x, y):
+    # Renvoie les pions retournés : c'est l'enregistrement pour undo_move
+    if isinstance(board, Board):
+        return board.make_move(player, x, y)
+    return _make_move(board, player, x, y)
+
+def _undo_move(board, player, x, y, flipped):
+    board[x][y] = EMPTY
+    opp = opponent(player)
+    for fx, fy in flipped:
+        board[fx][fy] = opp
+
+def undo_move(board, player, x, y, flipped):
+    if isinstance(board, Board):
+        board.undo_move(player, x, y, flipped)
+    else:
+        _undo_move(board, player, x, y, flipped)
+
+def zobrist_hash(board, player):
+    key = ZOBRIST_SIDE if player == WHITE else 0
+    for x in range(BOARD_SIZE):
+        for y in range(BOARD_SIZE):
+            if board[x][y] != EMPTY:
+                key ^= ZOBRIST[board[x][y]][x * BOARD_SIZE + y]
+    return key
+
+def zobrist_move(key, player, x, y, flipped):
+    # Clé après make_move : pion posé, pions retournés et changement de trait
+    own, opp = ZOBRIST[player], ZOBRIST[opponent(player)]
+    key ^= own[x * BOARD_SIZE + y] ^ ZOBRIST_SIDE
+    for fx, fy in flipped:
+        sq = fx * BOARD_SIZE + fy
+        key ^= own[sq] ^ opp[sq]
+    return key
 
 def count_pieces(board):
+    if isinstance(board, Board):
+        return board.count_pieces()
     b = sum(row.count(BLACK) for row in board)
     w = sum(row.count(WHITE) for row in board)
     return b, w
@@ -0,0 +1,191 @@
+"""
+Exact endgame solver.
+
+Plays perfectly from positions with few empty squares. The search runs on
+bitboards whatever engine the caller uses (board.py boards are converted).
+Scores are final disc differences (own - opponent) with perfect play.
+
+Techniques: negamax alpha-beta with null-window (PVS) re-searches, moves
+ordered by opponent mobility then region parity, and a dedicated solver
+for the last 4 empties that walks the empty-square list instead of
+generating move masks.
+"""
+
+from bitboard import SIDE, FULL, moves_mask, flips_mask, from_board
+
+INF = 65
+MOBILITY_EMPTIES = 7  # at or below this, order moves by parity only
+
+# Quadrants used for parity ordering
+QUADRANTS = [0x000000000F0F0F0F, 0x00000000F0F0F0F0,
+             0x0F0F0F0F00000000, 0xF0F0F0F000000000]
+QUADRANT_OF = [next(q for q in QUADRANTS if q >> sq & 1) for sq in range(64)]
+
+
+def empties_count(board, engine):
+    black, white = engine.count_pieces(board)
+    return 64 - black - white
+
+
+def endgame_move(board, color, engine, max_empties, stats=None):
+    """
+    Perfect move for color if the position has at most max_empties empty
+    squares, otherwise None. Agents call this first to switch to the solver.
+    The solver's score and node count go into stats if given.
+    """
+    if max_empties is None or empties_count(board, engine) > max_empties:
+        return None
+    solver = EndgameSolver()
+    score, move = solver.solve(board, color)
+    if stats is not None:
+        stats.update(endgame=True, nodes=solver.nodes, score=score)
+    return move
+
+
+def squares_index(mask):
+    """Square indices set in mask, lowest first."""
+    result = []
+    while mask:
+        lsb = mask & -mask
+        result.append(lsb.bit_length() - 1)
+        mask ^= lsb
+    return result
+
+
+def _final_score(own, opp):
+    return own.bit_count() - opp.bit_count()
+
+
+def _parity_order(own, opp, sqs):
+    """Empties in odd regions first (the last move of a region is worth keeping)."""
+    empty = ~(own | opp) & FULL
+    return sorted(sqs, key=lambda sq: (empty & QUADRANT_OF[sq]).bit_count() % 2 == 0)
+
+
+class EndgameSolver:
+    def __init__(self):
+        self.nodes = 0
+
+    def solve(self, board, color, exact=True):
+        """
+        Solve the position for color.
+
+        Args:
+            board: board.py or bitboard board
+            color: Side to move ('B' or 'W')
+            exact: False only decides win/draw/loss (score sign), faster
+
+        Returns:
+            (score, move): final disc difference for color and a best move,
+            move being None if color has to pass
+        """
+        bits = board if isinstance(board[0], int) else from_board(board)
+        me = SIDE[color]
+        own, opp = bits[me], bits[1 - me]
+        alpha, beta = (-INF, INF) if exact else (-1, 1)
+
+        moves = moves_mask(own, opp)
+        if not moves:
+            return self._search(own, opp, alpha, beta), None
+
+        best_score, best_move = -INF, None
+        for i, (sq, flips) in enumerate(self._ordered(own, opp, moves)):
+            new_own, new_opp = own | flips | (1 << sq), opp & ~flips
+            if i == 0:
+                score = -self._search(new_opp, new_own, -beta, -alpha)
+            else:
+                score = -self._search(new_opp, new_own, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = -self._search(new_opp, new_own, -beta, -score)
+            if score > best_score:
+                best_score, best_move = score, (sq >> 3, sq & 7)
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    break
+        return best_score, best_move
+
+    def _ordered(self, own, opp, moves):
+        """
+        (square, flips) for each move, fewest opponent replies first. Near
+        the end mobility costs more than it saves and only parity is used.
+        """
+        empty = ~(own | opp) & FULL
+        use_mobility = empty.bit_count() > MOBILITY_EMPTIES
+        scored = []
+        for sq in squares_index(moves):
+            flips = flips_mask(own, opp, sq)
+            odd = (empty & QUADRANT_OF[sq]).bit_count() & 1
+            mobility = 0
+            if use_mobility:
+                mobility = moves_mask(opp & ~flips, own | flips | (1 << sq)).bit_count()
+            scored.append((2 * mobility - odd, sq, flips))
+        scored.sort()
+        return [(sq, flips) for _, sq, flips in scored]
+
+    def _search(self, own, opp, alpha, beta):
+        self.nodes += 1
+        empty = ~(own | opp) & FULL
+        n_empty = empty.bit_count()
+        if n_empty <= 4:
+            return self._solve_small(own, opp, _parity_order(own, opp, squares_index(empty)),
+                                     alpha, beta)
+
+        moves = moves_mask(own, opp)
+        if not moves:
+            if not moves_mask(opp, own):
+                return _final_score(own, opp)
+            return -self._search(opp, own, -beta, -alpha)
+
+        best = -INF
+        for i, (sq, flips) in enumerate(self._ordered(own, opp, moves)):
+            new_own, new_opp = own | flips | (1 << sq), opp & ~flips
+            if i == 0:
+                score = -self._search(new_opp, new_own, -beta, -alpha)
+            else:
+                score = -self._search(new_opp, new_own, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = -self._search(new_opp, new_own, -beta, -score)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def _solve_small(self, own, opp, empties, alpha, beta):
+        # Last 4 empties: try each empty square directly, no move masks
+        self.nodes += 1
+        if len(empties) == 1:
+            return self._solve_last(own, opp, empties[0])
+
+        best = -INF
+        for sq in empties:
+            flips = flips_mask(own, opp, sq)
+            if not flips:
+                continue
+            rest = [s for s in empties if s != sq]
+            score = -self._solve_small(opp & ~flips, own | flips | (1 << sq), rest, -beta, -alpha)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        return best
+        if best > -INF:
+            return best
+
+        # No move: pass if the opponent can play, otherwise the game is over
+        for sq in empties:
+            if flips_mask(opp, own, sq):
+                return -self._solve_small(opp, own, empties, -beta, -alpha)
+        return _final_score(own, opp)
+
+    def _solve_last(self, own, opp, sq):
+        flips = flips_mask(own, opp, sq)
+        if flips:
+            return _final_score(own | flips | (1 << sq), opp & ~flips)
+        flips = flips_mask(opp, own, sq)
+        if flips:
+            return _final_score(own & ~flips, opp | flips | (1 << sq))
+        return _final_score(own, opp)
@@ -1,24 +1,30 @@
-from board import valid_moves, make_move, opponent, EMPTY, BOARD_SIZE
+import board as board_engine
+from bitboard import SIDE, moves_mask, flips_mask
+from instrument import record_stats
 
 import copy
 
 class GreedyAgent:
-    def __init__(self, color):
+    def __init__(self, color, engine=board_engine):
         self.color = color
+        self.engine = engine
 
+    @record_stats
     def get_move(self, board):
-        moves = valid_moves(board, self.color)
+        moves = self.engine.valid_moves(board, self.color)
+        self.stats.update(moves=len(moves), nodes=len(moves), depth=1)
         if not moves:
             return None
 
         best_score = -1
         best_move = None
 
+        board = copy.deepcopy(board)  # plateau de travail, joué puis défait
         for move in moves:
             # Simuler le coup
-            test_board = copy.deepcopy(board)
-            make_move(test_board, self.color, *move)
-            score = self.evaluate(test_board)
+            flipped = self.engine.make_move(board, self.color, *move)
+            score = self.evaluate(board)
+            self.engine.undo_move(board, self.color, *move, flipped)
 
             if score > best_score:
                 best_score = score
@@ -26,6 +32,35 @@ class GreedyAgent:
 
         return best_move
 
+    @record_stats
+    def get_moves(self, boards):
+        # Un coup pour chaque plateau, en un seul appel (parties en parallèle).
+        # Sur bitboards, le score d'un coup est 1 + le nombre de pions retournés :
+        # pas besoin de jouer puis défaire le coup
+        if not boards or not isinstance(boards[0][0], int):
+            return [self.get_move(board) for board in boards]
+        me = SIDE[self.color]
+        moves = []
+        nodes = 0
+        for board in boards:
+            own, opp = board[me], board[1 - me]
+            mask = moves_mask(own, opp)
+            best_gain = 0
+            best_sq = None
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                sq = bit.bit_length() - 1
+                gain = flips_mask(own, opp, sq).bit_count()
+                nodes += 1
+                if gain > best_gain:  # premier meilleur coup, comme get_move
+                    best_gain = gain
+                    best_sq = sq
+            moves.append(None if best_sq is None else divmod(best_sq, 8))
+        self.stats.update(boards=len(boards), nodes=nodes, depth=1)
+        return moves
+
     def evaluate(self, board):
         # Score simple : nombre de pions du joueur
-        return sum(row.count(self.color) for row in board)
+        black, white = self.engine.count_pieces(board)
+        return black if self.color == "B" else white
@@ -0,0 +1,123 @@
+"""
+Optional instrumentation for the agents.
+
+- record_stats decorates get_move: it resets agent.stats, lets the agent
+  fill it (nodes, depth, simulations, ...) and adds the wall time.
+- instrument_agent swaps the agent's engine for an InstrumentedEngine and
+  times its evaluation/rollout methods, so the stats also say how many
+  calls and how much time went to valid_moves, make_move and evaluation.
+- ProfileMove is a play_game move hook that runs cProfile (or any other
+  profiler context manager) around a single move.
+- write_jsonl exports the per-move records collected by play_game.
+"""
+
+import cProfile
+import contextlib
+import functools
+import json
+import pstats
+import time
+
+EVALUATION_METHODS = ("evaluate", "_evaluate", "rollout", "_simulate")
+
+
+def record_stats(get_move):
+    @functools.wraps(get_move)
+    def wrapper(self, board, *args, **kwargs):
+        self.stats = {}
+        counters = getattr(self.engine, "counters", None)
+        if counters is not None:
+            counters.clear()
+        start = time.perf_counter()
+        move = get_move(self, board, *args, **kwargs)
+        self.stats["time"] = time.perf_counter() - start
+        if counters is not None:
+            self.stats.update(counters)
+        return move
+    return wrapper
+
+
+def effective_branching(nodes, depth):
+    """b such that b + b^2 + ... + b^depth is about nodes (rough: nodes ** (1 / depth))."""
+    if not depth or nodes <= 1:
+        return 0.0
+    return nodes ** (1.0 / depth)
+
+
+class InstrumentedEngine:
+    """Wraps a board engine module, counting calls and time per function."""
+
+    TIMED = ("valid_moves", "make_move", "undo_move")
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.__name__ = engine.__name__  # agents pickle their engine by name
+        self.counters = {}
+        for name in self.TIMED:
+            setattr(self, name, self._timed(name, getattr(engine, name)))
+
+    def _timed(self, name, function):
+        counters = self.counters
+
+        def timed(*args):
+            start = time.perf_counter()
+            result = function(*args)
+            counters[name + "_calls"] = counters.get(name + "_calls", 0) + 1
+            counters[name + "_time"] = counters.get(name + "_time", 0.0) \
+                + time.perf_counter() - start
+            return result
+        return timed
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+
+def instrument_agent(agent):
+    """Count engine calls and time evaluation for this agent only."""
+    engine = InstrumentedEngine(agent.engine)
+    agent.engine = engine
+    for name in EVALUATION_METHODS:
+        method = getattr(agent, name, None)
+        if method is not None:
+            setattr(agent, name, engine._timed("evaluation", method))
+    return agent
+
+
+class ProfileMove:
+    """
+    Move hook for play_game: profiles the move at ply `ply` (optionally
+    only for `color`). `profiler` builds any context manager, cProfile by
+    default; the cProfile report is printed or saved to `output`.
+    """
+
+    def __init__(self, ply, color=None, profiler=None, output=None, sort="cumulative"):
+        self.ply = ply
+        self.color = color
+        self.profiler = profiler
+        self.output = output
+        self.sort = sort
+        self.result = None
+
+    def __call__(self, ply, color):
+        if ply != self.ply or (self.color is not None and color != self.color):
+            return contextlib.nullcontext()
+        if self.profiler is not None:
+            self.result = self.profiler()
+            return self.result
+        return self._cprofile()
+
+    @contextlib.contextmanager
+    def _cprofile(self):
+        self.result = cProfile.Profile()
+        with self.result:
+            yield
+        if self.output:
+            self.result.dump_stats(self.output)
+        else:
+            pstats.Stats(self.result).sort_stats(self.sort).print_stats(20)
+
+
+def write_jsonl(records, path):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
@@ -0,0 +1,86 @@
+"""
+Many games in lockstep, for cheap agents.
+
+play_games keeps a batch of games running at once. Each step, every game
+waiting for black goes to the black agent in one get_moves(boards) call,
+then every game waiting for white goes to the white agent. Finished games
+leave the batch and new ones take their place, so the batch stays full
+until the last games. Agents without get_moves are asked one board at a
+time (see get_moves below). The two agents are shared by all the games of
+the batch, so agents that keep state between moves (MCTS tree reuse,
+pondering) should not be used here.
+"""
+
+import random
+
+import bitboard
+from main import AGENTS, ENGINES
+
+
+def get_moves(agent, boards):
+    """agent.get_moves(boards) if the agent has it, else get_move on each board."""
+    batched = getattr(agent, "get_moves", None)
+    if batched is not None:
+        return batched(boards)
+    return [agent.get_move(board) for board in boards]
+
+
+def can_move(engine, board, color):
+    if engine is bitboard:
+        me = bitboard.SIDE[color]
+        return bool(bitboard.moves_mask(board[me], board[1 - me]))
+    return bool(engine.valid_moves(board, color))
+
+
+def play_games(spec_black, spec_white, n_games, batch_size=256, engine="bitboard", seed=0):
+    """
+    Play n_games games between two agents, batch_size at a time.
+
+    Args:
+        spec_black: (name in main.AGENTS, kwargs) of the black agent
+        spec_white: Same for the white agent
+        n_games: Number of games
+        batch_size: Games running at once
+        engine: Name in main.ENGINES
+        seed: Seed of the random module
+
+    Returns:
+        (black discs, white discs) of each game, in game order
+    """
+    random.seed(seed)
+    engine = ENGINES[engine]
+    agents = {"B": AGENTS[spec_black[0]]("B", engine=engine, **spec_black[1]),
+              "W": AGENTS[spec_white[0]]("W", engine=engine, **spec_white[1])}
+    results = [None] * n_games
+    games = []  # [game index, board, color to move]
+    started = 0
+
+    while started < n_games or games:
+        while started < n_games and len(games) < batch_size:
+            games.append([started, engine.create_board(), "B"])
+            started += 1
+
+        for color in ("B", "W"):
+            waiting = []
+            for game in games:
+                if game[2] != color:
+                    continue
+                if can_move(engine, game[1], color):
+                    waiting.append(game)
+                elif can_move(engine, game[1], engine.opponent(color)):
+                    game[2] = engine.opponent(color)  # pass
+                else:
+                    results[game[0]] = engine.count_pieces(game[1])
+                    game[2] = None  # game over
+            if waiting:
+                moves = get_moves(agents[color], [game[1] for game in waiting])
+                for game, move in zip(waiting, moves):
+                    engine.make_move(game[1], color, *move)
+                    game[2] = engine.opponent(color)
+
+        games = [game for game in games if game[2] is not None]
+
+    for agent in agents.values():
+        if hasattr(agent, "close"):
+            agent.close()
+    return results
@@ -1,51 +1,102 @@
-from board import create_board, make_move, valid_moves, opponent, count_pieces
+import contextlib
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import board as board_engine
+import bitboard
 from random_ai import RandomAgent
 from greedy_ai import GreedyAgent
 from minimax_ai import MinimaxAgent
+from minimax_ai_Romain import MinimaxAgentRomain
 from mcts_ai import MCTSAgent
+from mcts_ai_Romain import MCTSAgentRomain
+
+ENGINES = {"list": board_engine, "bitboard": bitboard}
+# Agents désignés par leur nom pour pouvoir les créer dans un autre processus
+AGENTS = {"random": RandomAgent, "greedy": GreedyAgent,
+          "minimax": MinimaxAgent, "minimax_romain": MinimaxAgentRomain,
+          "mcts": MCTSAgent, "mcts_romain": MCTSAgentRomain}
+
+def notify(agent, event, *args):
+    # Méthodes facultatives des agents : ponder(board) après leur coup,
+    # opponent_moved(board, move) quand l'adversaire a joué (None : il a passé),
+    # stop_pondering() en fin de partie
+    method = getattr(agent, event, None)
+    if method is not None:
+        method(*args)
 
-def play_game(agent_black, agent_white, verbose=False):
-    board = create_board()
+def play_game(agent_black, agent_white, verbose=False, engine=board_engine, stats=None,
+              move_hook=None, opening=None):
+    # stats : liste qui reçoit un enregistrement par coup (agent.stats compris)
+    # move_hook(ply, couleur) : gestionnaire de contexte autour de get_move
+    # (par exemple instrument.ProfileMove pour profiler un seul coup)
+    # Les agents sont prévenus des coups adverses (voir notify) pour pouvoir
+    # réfléchir pendant le tour de l'adversaire
+    # opening : coups (x, y) joués d'office avant que les agents prennent la main
+    board = engine.create_board()
     current_agent = agent_black
     other_agent = agent_white
 
     current_color = "B"
     other_color = "W"
 
+    for move in opening or ():
+        if not engine.is_valid_move(board, current_color, *move):
+            # le camp au trait a dû passer
+            current_agent, other_agent = other_agent, current_agent
+            current_color, other_color = other_color, current_color
+        engine.make_move(board, current_color, *move)
+        current_agent, other_agent = other_agent, current_agent
+        current_color, other_color = other_color, current_color
+
     no_move_passes = 0
+    ply = 0
 
     while True:
-        moves = valid_moves(board, current_color)
+        moves = engine.valid_moves(board, current_color)
         if not moves:
             no_move_passes += 1
             if no_move_passes == 2:
                 break  # les deux passent → fin
             # sinon on passe le tour
+            notify(other_agent, "opponent_moved", board, None)
             current_agent, other_agent = other_agent, current_agent
             current_color, other_color = other_color, current_color
             continue
         no_move_passes = 0
 
-        move = current_agent.get_move(board)
+        hook = move_hook(ply, current_color) if move_hook else contextlib.nullcontext()
+        with hook:
+            move = current_agent.get_move(board)
+        if stats is not None:
+            stats.append({"ply": ply, "color": current_color,
+                          "agent": type(current_agent).__name__, "move": move,
+                          **getattr(current_agent, "stats", {})})
+        ply += 1
         if move:
-            make_move(board, current_color, *move)
+            engine.make_move(board, current_color, *move)
+        notify(other_agent, "opponent_moved", board, move)
+        notify(current_agent, "ponder", board)
         current_agent, other_agent = other_agent, current_agent
         current_color, other_color = other_color, current_color
 
-    black_score, white_score = count_pieces(board)
+    notify(agent_black, "stop_pondering")
+    notify(agent_white, "stop_pondering")
+    black_score, white_score = engine.count_pieces(board)
     if verbose:
         print(f"Score final - Noir (B): {black_score}, Blanc (W): {white_score}")
     return black_score, white_score
 
-def tournament(n_games=10):
+def tournament(n_games=10, engine="list"):
+    engine = ENGINES[engine]
     black_wins = 0
     white_wins = 0
     draws = 0
 
     for i in range(n_games):
-        black = GreedyAgent("B")
-        white = MCTSAgent("W", simulations=500)
-        b_score, w_score = play_game(black, white)
+        black = GreedyAgent("B", engine=engine)
+        white = MCTSAgent("W", simulations=500, engine=engine)
+        b_score, w_score = play_game(black, white, engine=engine)
 
         if b_score > w_score:
             black_wins += 1
@@ -59,5 +110,53 @@ def tournament(n_games=10):
     print(f"MCTS (Blanc) gagne {white_wins} fois")
     print(f"Égalités : {draws}")
 
+def play_seeded_game(spec_a, spec_b, game_index, seed, engine="list"):
+    # spec = (nom dans AGENTS, kwargs) ; A joue Noir aux parties paires
+    random.seed(seed)
+    engine = ENGINES[engine]
+    (name_a, kwargs_a), (name_b, kwargs_b) = spec_a, spec_b
+    if game_index % 2 == 0:
+        agent_a = AGENTS[name_a]("B", engine=engine, **kwargs_a)
+        agent_b = AGENTS[name_b]("W", engine=engine, **kwargs_b)
+        score_a, score_b = play_game(agent_a, agent_b, engine=engine)
+    else:
+        agent_b = AGENTS[name_b]("B", engine=engine, **kwargs_b)
+        agent_a = AGENTS[name_a]("W", engine=engine, **kwargs_a)
+        score_b, score_a = play_game(agent_b, agent_a, engine=engine)
+    return game_index, score_a, score_b
+
+def iter_games(spec_a, spec_b, n_games, workers=None, seed=0, engine="list"):
+    # Les graines sont tirées à l'avance : chaque partie donne le même résultat
+    # quel que soit le nombre de processus, seul l'ordre d'arrivée change
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for _ in range(n_games)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_seeded_game, spec_a, spec_b, i, seeds[i], engine)
+                   for i in range(n_games)]
+        for future in as_completed(futures):
+            yield future.result()
+
+def parallel_tournament(spec_a=("greedy", {}), spec_b=("mcts", {"simulations": 500}),
+                        n_games=10, workers=None, seed=0, engine="list", verbose=False):
+    a_wins = 0
+    b_wins = 0
+    draws = 0
+
+    for game_index, score_a, score_b in iter_games(spec_a, spec_b, n_games, workers, seed, engine):
+        if score_a > score_b:
+            a_wins += 1
+        elif score_b > score_a:
+            b_wins += 1
+        else:
+            draws += 1
+        if verbose:
+            print(f"Partie {game_index} : {spec_a[0]} {score_a} - {score_b} {spec_b[0]}")
+
+    print(f"Sur {n_games} parties (couleurs alternées) :")
+    print(f"{spec_a[0]} gagne {a_wins} fois")
+    print(f"{spec_b[0]} gagne {b_wins} fois")
+    print(f"Égalités : {draws}")
+    return a_wins, b_wins, draws
+
 if __name__ == "__main__":
     tournament(n_games=10)
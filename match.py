@@ -0,0 +1,246 @@
+"""
+Matches with a sequential probability ratio test (SPRT).
+
+    python match.py mcts greedy --elo0 0 --elo1 50
+    python match.py --round-robin --max-pairs 50
+
+Games are played in pairs: a random opening of a few plies, then the same
+opening twice with the colours swapped, so neither the opening nor the
+first move favours one side. After every pair the Elo difference of A
+over B is re-estimated with a confidence interval, and an SPRT between
+H0: elo = elo0 and H1: elo = elo1 decides whether to stop. The test uses
+the normal approximation of the generalized SPRT, with the mean score of
+a pair as one sample. Pairs run in worker processes, a few per worker at a
+time; pairs still running when the test stops are dropped.
+"""
+
+import argparse
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from main import AGENTS, ENGINES, play_game
+
+# Budgets small enough for a round robin to finish in minutes
+DEFAULT_SPECS = {"random": {}, "greedy": {},
+                 "minimax": {"depth": 3}, "minimax_romain": {"depth": 3},
+                 "mcts": {"simulations": 200}, "mcts_romain": {"iterations": 200}}
+
+Z_95 = 1.959964
+
+
+def score_to_elo(score):
+    """Elo difference for an expected score in (0, 1)."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def elo_to_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class SPRT:
+    def __init__(self, elo0=0, elo1=50, alpha=0.05, beta=0.05, min_samples=8):
+        """
+        Args:
+            elo0: Elo difference of the null hypothesis
+            elo1: Elo difference of the alternative hypothesis (elo1 > elo0)
+            alpha: Probability of accepting H1 when H0 holds
+            beta: Probability of accepting H0 when H1 holds
+            min_samples: Samples before a decision (the variance of a handful
+                of pairs is too unreliable to stop on)
+        """
+        if elo1 <= elo0:
+            raise ValueError("elo1 must be greater than elo0")
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.min_samples = min_samples
+        self.samples = []
+
+    def add(self, sample):
+        """Record one sample: the mean score of A in a pair of games."""
+        self.samples.append(sample)
+
+    def mean_variance(self):
+        n = len(self.samples)
+        mean = sum(self.samples) / n
+        return mean, sum((x - mean) ** 2 for x in self.samples) / n
+
+    def llr(self):
+        """Log-likelihood ratio of H1 against H0 (0 until it can be estimated)."""
+        if len(self.samples) < 2:
+            return 0.0
+        mean, variance = self.mean_variance()
+        if variance == 0:
+            # All pairs ended alike: variance of a pair of independent decisive games
+            variance = 0.125
+        s0, s1 = elo_to_score(self.elo0), elo_to_score(self.elo1)
+        return len(self.samples) * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+    def status(self):
+        """'H0', 'H1' or None while undecided."""
+        if len(self.samples) < self.min_samples:
+            return None
+        llr = self.llr()
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
+
+    def elo(self, z=Z_95):
+        """
+        (Elo estimate, lower bound, upper bound) of A over B; with no sample
+        yet, 0 within an unbounded interval.
+        """
+        if not self.samples:
+            return 0.0, -math.inf, math.inf
+        mean, variance = self.mean_variance()
+        margin = z * math.sqrt(variance / len(self.samples))
+        return score_to_elo(mean), score_to_elo(mean - margin), score_to_elo(mean + margin)
+
+
+def random_opening(rng, plies, engine):
+    """A list of `plies` random legal moves from the start position."""
+    board = engine.create_board()
+    color = "B"
+    moves = []
+    while len(moves) < plies:
+        legal = engine.valid_moves(board, color)
+        if not legal:
+            color = engine.opponent(color)
+            continue
+        move = rng.choice(legal)
+        engine.make_move(board, color, *move)
+        moves.append(move)
+        color = engine.opponent(color)
+    return moves
+
+
+def play_pair(spec_a, spec_b, opening, seed, engine="bitboard"):
+    """Points of A (1 win, 0.5 draw) over both colours of one opening."""
+    engine = ENGINES[engine]
+    rng = random.Random(seed)
+    points = 0.0
+    for a_black in (True, False):
+        random.seed(rng.getrandbits(32))
+        agent_a = AGENTS[spec_a[0]]("B" if a_black else "W", engine=engine, **spec_a[1])
+        agent_b = AGENTS[spec_b[0]]("W" if a_black else "B", engine=engine, **spec_b[1])
+        black, white = (agent_a, agent_b) if a_black else (agent_b, agent_a)
+        black_score, white_score = play_game(black, white, engine=engine, opening=opening)
+        for agent in (agent_a, agent_b):
+            if hasattr(agent, "close"):
+                agent.close()
+        score_a, score_b = (black_score, white_score) if a_black else (white_score, black_score)
+        points += 1 if score_a > score_b else 0.5 if score_a == score_b else 0
+    return points
+
+
+def sprt_match(spec_a, spec_b, elo0=0, elo1=50, alpha=0.05, beta=0.05, max_pairs=500,
+               opening_plies=4, workers=None, seed=0, engine="bitboard", verbose=False):
+    """
+    Play pairs of A against B until the SPRT is decided or max_pairs pairs
+    are played. Specs are (name in main.AGENTS, kwargs).
+
+    Returns:
+        dict with the decision ('H0', 'H1' or None), the pairs and games
+        played, A's points, the Elo estimate with its 95% interval and the LLR
+    """
+    test = SPRT(elo0, elo1, alpha, beta)
+    rng = random.Random(seed)
+    points = 0.0
+    window = 2 * (workers or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        submitted = 0
+        while submitted < max_pairs or pending:
+            while submitted < max_pairs and len(pending) < window:
+                opening = random_opening(rng, opening_plies, ENGINES[engine])
+                pending.add(pool.submit(play_pair, spec_a, spec_b, opening,
+                                        rng.getrandbits(32), engine))
+                submitted += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pair_points = future.result()
+                points += pair_points
+                test.add(pair_points / 2)
+            if verbose:
+                elo, low, high = test.elo()
+                print(f"{len(test.samples)} pairs: {spec_a[0]} - {spec_b[0]} "
+                      f"Elo {elo:+.0f} [{low:+.0f}, {high:+.0f}], LLR {test.llr():.2f} "
+                      f"({test.lower:.2f}, {test.upper:.2f})")
+            if test.status():
+                for future in pending:
+                    future.cancel()
+                break
+
+    elo, low, high = test.elo()
+    return {"a": spec_a[0], "b": spec_b[0], "decision": test.status(),
+            "pairs": len(test.samples), "games": 2 * len(test.samples), "points": points,
+            "elo": elo, "elo_low": low, "elo_high": high, "llr": test.llr()}
+
+
+def round_robin(specs=None, verbose=True, **kwargs):
+    """
+    SPRT match between every two agents (kwargs go to sprt_match).
+    specs maps agent names to their kwargs, by default DEFAULT_SPECS.
+
+    Returns:
+        (list of match results, {agent: Elo against the field}), where the
+        rating of an agent comes from its mean score over all its games
+    """
+    specs = specs or DEFAULT_SPECS
+    names = list(specs)
+    results = []
+    points = dict.fromkeys(names, 0.0)
+    games = dict.fromkeys(names, 0)
+    for i, name_a in enumerate(names):
+        for name_b in names[i + 1:]:
+            result = sprt_match((name_a, specs[name_a]), (name_b, specs[name_b]), **kwargs)
+            results.append(result)
+            points[name_a] += result["points"]
+            points[name_b] += result["games"] - result["points"]
+            games[name_a] += result["games"]
+            games[name_b] += result["games"]
+            if verbose:
+                print(f"{name_a} - {name_b} : {result['points']}/{result['games']}, "
+                      f"Elo {result['elo']:+.0f} [{result['elo_low']:+.0f}, "
+                      f"{result['elo_high']:+.0f}], {result['decision'] or 'undecided'}")
+    ratings = {name: score_to_elo(points[name] / games[name]) if games[name] else 0.0
+               for name in names}
+    if verbose:
+        for name, rating in sorted(ratings.items(), key=lambda item: -item[1]):
+            print(f"{name:16s} {rating:+6.0f}")
+    return results, ratings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SPRT matches between agents")
+    parser.add_argument("agents", nargs="*", metavar="AGENT",
+                        help="the two agents of a match, among " + ", ".join(AGENTS))
+    parser.add_argument("--round-robin", action="store_true", help="match every two agents")
+    parser.add_argument("--elo0", type=float, default=0)
+    parser.add_argument("--elo1", type=float, default=50)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--max-pairs", type=int, default=500)
+    parser.add_argument("--opening-plies", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    options = dict(elo0=args.elo0, elo1=args.elo1, alpha=args.alpha, beta=args.beta,
+                   max_pairs=args.max_pairs, opening_plies=args.opening_plies,
+                   workers=args.workers, seed=args.seed)
+    if args.round_robin:
+        round_robin(**options)
+    elif len(args.agents) == 2 and all(name in AGENTS for name in args.agents):
+        name_a, name_b = args.agents
+        print(sprt_match((name_a, DEFAULT_SPECS[name_a]), (name_b, DEFAULT_SPECS[name_b]),
+                         verbose=True, **options))
+    else:
+        parser.error("give two agents among %s, or --round-robin" % ", ".join(AGENTS))
@@ -1,29 +1,59 @@
 import copy
+import importlib
 import math
 import random
-from board import valid_moves, make_move, opponent, count_pieces
+import board as board_engine
+import parallel_mcts
+from board import opponent
+from mcts_tree import ArrayTree, NOT_GENERATED
+from endgame import endgame_move
+from instrument import record_stats
+from batch_rollout import leaf_wins
+from opening_book import book_move, open_book
+from symmetry import unique_moves
+from search_budget import SearchBudget
 
 class Node:
-    def __init__(self, state, parent=None, move=None, player=None):
+    def __init__(self, state, parent=None, move=None, player=None, engine=board_engine):
         self.state = state
+        self.engine = engine
         self.parent = parent
         self.move = move
         self.wins = 0
         self.visits = 0
+        self.amaf_wins = 0  # statistiques RAVE : coup joué plus tard dans une simulation
+        self.amaf_visits = 0
         self.children = []
-        self.untried_moves = valid_moves(state, player if player else "B")
         self.player = player  # Stocke le joueur associé au nœud
+        # Coups du joueur au trait : `player` à la racine, son adversaire ensuite
+        to_move = opponent(player) if move else (player if player else "B")
+        self.untried_moves = engine.valid_moves(state, to_move)
 
+    def __getstate__(self):
+        # Envoi au processus de réflexion : moteur par son nom
+        state = self.__dict__.copy()
+        state["engine"] = self.engine.__name__
+        return state
+
+    def __setstate__(self, state):
+        state["engine"] = importlib.import_module(state["engine"])
+        self.__dict__.update(state)
 
     def is_fully_expanded(self):
         return len(self.untried_moves) == 0
 
-    def best_child(self, exploration=1.41):
+    def best_child(self, exploration=1.41, rave=None):
+        # rave : constante k de RAVE, beta = sqrt(k / (3 n + k)) décroît avec
+        # les visites n de l'enfant (None : UCB1 seul)
         best_score = float("-inf")
         best_child = None
 
         for child in self.children:
             exploitation = child.wins / child.visits
+            if rave and child.amaf_visits:
+                beta = math.sqrt(rave / (3 * child.visits + rave))
+                exploitation = (1 - beta) * exploitation \
+                    + beta * child.amaf_wins / child.amaf_visits
             exploration_term = exploration * math.sqrt(math.log(self.visits) / child.visits)
             ucb1 = exploitation + exploration_term
 
@@ -41,61 +71,363 @@ class Node:
         player = opponent(self.player) if self.move else self.player
 
         # Appliquer le coup
-        make_move(new_state, player, move[0], move[1])
+        self.engine.make_move(new_state, player, move[0], move[1])
 
         # Créer le nœud enfant avec le joueur suivant
-        child_node = Node(new_state, parent=self, move=(move[0], move[1], player), player=player)
+        child_node = Node(new_state, parent=self, move=(move[0], move[1], player), player=player,
+                          engine=self.engine)
         self.children.append(child_node)
         return child_node
 
 
-    def update(self, result):
-        self.visits += 1
+    def update(self, result, count=1):
+        self.visits += count
         self.wins += result
 
+    def update_amaf(self, played, result):
+        # AMAF : les enfants dont le coup (x, y, joueur) a été joué plus bas
+        for child in self.children:
+            if child.move in played:
+                child.amaf_visits += 1
+                child.amaf_wins += result
+
 class MCTSAgent:
-    def __init__(self, color, simulations=100):
+    def __init__(self, color, simulations=100, engine=board_engine, workers=1, reuse_tree=True,
+                 storage="nodes", max_nodes=None, endgame_empties=None, batch=1,
+                 book=None, merge_symmetric=True, time_limit=None, early_stop=True, rave=None,
+                 pondering=False):
+        if rave and (storage != "nodes" or batch > 1):
+            raise ValueError("rave needs storage='nodes' and batch=1")
         self.color = color
+        # Budget par coup : simulations et/ou secondes (None : pas de limite de ce type)
         self.simulations = simulations
+        self.time_limit = time_limit
+        self.early_stop = early_stop  # arrêt dès que le meilleur coup ne peut plus changer
+        self.simulations_used = 0
+        self.engine = engine
+        self.workers = workers  # > 1 : un arbre indépendant par processus
+        self.pool = None
+        self.reuse_tree = reuse_tree  # garde l'arbre d'un coup à l'autre
+        self.tree = None
+        self.reused_visits = 0
+        # "nodes" : objets Node ; "arrays" : ArrayTree, limité à max_nodes nœuds
+        self.storage = storage
+        self.max_nodes = max_nodes
+        self.endgame_empties = endgame_empties  # résolution exacte sous ce nombre de cases vides
+        self.batch = batch  # parties aléatoires jouées ensemble depuis chaque feuille
+        self.book = open_book(book)  # bibliothèque d'ouvertures (fichier ou OpeningBook)
+        self.merge_symmetric = merge_symmetric  # un seul coup par classe de coups symétriques
+        self.rave = rave  # constante k de RAVE/AMAF (None : UCB1 seul)
+        # Réflexion pendant le tour adverse, dans un processus à part (arbre
+        # de nœuds, workers=1), voir parallel_mcts.start_pondering
+        self.pondering = pondering
+        self.ponder_pool = None
+        self.ponder_signal = None
+        self.ponder_future = None
+        self.ponder_node = None  # nœud dont le sous-arbre grandit dans l'autre processus
+        # Visites au départ de la réflexion : (visites, {coup: visites}) pendant
+        # la réflexion, puis (nœud de réflexion, {nœud: visites}) une fois greffé
+        self.ponder_start = None
+        self.pondered = 0  # itérations et secondes de la dernière réflexion
+        self.ponder_seconds = 0.0
+        # Générateur propre à l'agent, tiré du module random : les parties
+        # lancées après random.seed restent reproductibles
+        self.rng = random.Random(random.getrandbits(64))
+        self.stats = {}
+
+    def __getstate__(self):
+        # Le module moteur et le pool ne se picklent pas (envoi aux processus)
+        state = self.__dict__.copy()
+        state["engine"] = self.engine.__name__
+        state["pool"] = None
+        state["tree"] = None
+        state["ponder_pool"] = None
+        state["ponder_signal"] = None
+        state["ponder_future"] = None
+        state["ponder_node"] = None
+        state["ponder_start"] = None
+        return state
+
+    def __setstate__(self, state):
+        state["engine"] = importlib.import_module(state["engine"])
+        self.__dict__.update(state)
+
+    def close(self):
+        self.stop_pondering()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    @record_stats
+    def get_move(self, board, time_limit=None, simulations=None):
+        # time_limit / simulations remplacent le budget de l'agent pour ce coup
+        move = book_move(board, self.color, self.engine, self.book, self.stats)
+        if move is not None:
+            return move
+        move = endgame_move(board, self.color, self.engine, self.endgame_empties, self.stats)
+        if move is not None:
+            return move
+
+        moves = self.root_moves(board)
+        if not moves:
+            return None
+        if len(moves) == 1:
+            # Un seul coup (à une symétrie près) : inutile de chercher
+            self.tree = None
+            self.stats.update(simulations=0, moves=1)
+            return moves[0]
+
+        if simulations is None and time_limit is None:
+            simulations, time_limit = self.simulations, self.time_limit
+        if self.workers > 1:
+            visits = parallel_mcts.merged_root_visits(self, board, simulations, time_limit)
+        else:
+            visits = self.root_visits(board, simulations, time_limit)
+
+        # Meilleur coup choisi (premier coup légal si aucune simulation n'a eu lieu)
+        best = max(visits, key=visits.get) if visits else moves[0]
+        self.stats.update(simulations=self.simulations_used, workers=self.workers,
+                          rollouts=self.simulations_used * self.batch, moves=len(moves),
+                          reused_visits=self.reused_visits, best_visits=visits.get(best, 0))
+        return best
+
+    def root_visits(self, board, simulations, time_limit=None):
+        if self.storage == "arrays":
+            return self.search_arrays(board, simulations, time_limit).root_visits()
+        root = self.search(board, simulations, time_limit)
+        return {(child.move[0], child.move[1]): child.visits for child in root.children}
+
+    def reused_root(self, board):
+        # Cherche la position actuelle sous l'ancienne racine : notre coup puis
+        # la réponse adverse (ou notre coup seul si l'adversaire a passé)
+        if not self.reuse_tree or self.tree is None:
+            return None
+        for child in self.tree.children:
+            for node in [child] + child.children:
+                if node.state == board:
+                    return self.make_root(node, board)
+        return None
+
+    def make_root(self, node, board):
+        # Le nœud devient une racine où c'est à nous de jouer : on ne garde
+        # que les enfants qui sont nos coups légaux
+        legal = self.root_moves(board)
+        node.parent = None
+        node.move = None
+        node.player = self.color
+        node.children = [c for c in node.children
+                         if c.move[2] == self.color and (c.move[0], c.move[1]) in legal]
+        expanded = [(c.move[0], c.move[1]) for c in node.children]
+        node.untried_moves = [m for m in legal if m not in expanded]
+        return node
+
+    def search(self, board, simulations, time_limit=None):
+        self.finish_pondering()
+        root = self.reused_root(board)
+        if root is None:
+            root = Node(copy.deepcopy(board), player=self.color, engine=self.engine)
+            root.untried_moves = self.root_moves(board)
+        self.reused_visits = root.visits
+        pondered = self.pondered_visits(root)
+        if pondered:
+            # Le travail fait sous la racine pendant le tour adverse (pas celui
+            # des coups précédents) est déduit du budget : simulations, et temps
+            # au prorata des itérations de la réflexion tombées sous la racine
+            if simulations is not None:
+                simulations = max(simulations - pondered // self.batch,
+                                  len(root.untried_moves) + 1)
+            if time_limit is not None:
+                share = pondered / (self.pondered * self.batch)
+                time_limit = max(0.0, time_limit - share * self.ponder_seconds)
+        self.ponder_start = None
+
+        budget = SearchBudget(simulations, time_limit, self.early_stop, self.batch)
+        while budget.running(lambda: [child.visits for child in root.children]):
+            self.iterate(root)
+
+        self.simulations_used = budget.used
+        self.tree = root if self.reuse_tree else None
+        return root
+
+    def iterate(self, root):
+        # Une simulation depuis root : sélection, expansion, partie aléatoire, mise à jour
+        node = root
+
+        # SELECTION
+        while node.is_fully_expanded() and node.children:
+            node = node.best_child(rave=self.rave)
+
+        # EXPANSION
+        if not node.is_fully_expanded():
+            node = node.expand()
+
+        # SIMULATION
+        played = [] if self.rave else None
+        result, count = self.simulate(node, played)
+
+        # BACKPROPAGATION (avec RAVE, chaque nœud met aussi à jour les
+        # enfants dont le coup a été joué plus loin dans la simulation)
+        seen = set(played) if self.rave else None
+        while node:
+            node.update(result, count)
+            if seen is not None:
+                node.update_amaf(seen, result)
+                if node.move:
+                    seen.add(node.move)
+            node = node.parent
+
+    def ponder(self, board):
+        # Appelé par play_game après notre coup : un autre processus fait
+        # grandir le sous-arbre de ce coup pendant que l'adversaire réfléchit.
+        # Avec un budget en simulations, la réflexion est d'un coup (le même
+        # nombre de simulations) et on l'attend si l'adversaire joue plus vite,
+        # pour que les parties avec graine restent reproductibles ; avec une
+        # limite de temps, elle dure jusqu'au coup adverse
+        if not self.pondering or self.storage != "nodes" or self.workers > 1 or self.tree is None:
+            return
+        node = next((child for child in self.tree.children if child.state == board), None)
+        if node is None:
+            return
+        # Visites de départ du nœud et de ses enfants (les réponses adverses),
+        # par coup : le sous-arbre revient en copie
+        self.ponder_node = node
+        self.ponder_start = (node.visits, {child.move: child.visits for child in node.children})
+        iterations = self.simulations if self.time_limit is None else None
+        parallel_mcts.start_pondering(self, node, iterations, "iterate")
+
+    def finish_pondering(self):
+        # Récupère le sous-arbre grandi par l'autre processus et le remet à
+        # la place de l'ancien dans l'arbre
+        result = parallel_mcts.finish_pondering(self)
+        if result is None:
+            return
+        grown, self.pondered, self.ponder_seconds = result
+        node, self.ponder_node = self.ponder_node, None
+        grown.parent = node.parent
+        siblings = node.parent.children
+        siblings[siblings.index(node)] = grown
+        visits, by_move = self.ponder_start
+        start = {child: by_move.get(child.move, 0) for child in grown.children}
+        start[grown] = visits
+        self.ponder_start = (grown, start)
+
+    def pondered_visits(self, root):
+        # Simulations ajoutées sous root pendant la dernière réflexion : root
+        # est le nœud de réflexion (l'adversaire a passé) ou l'un de ses
+        # enfants (un enfant créé pendant la réflexion partait de 0)
+        if self.ponder_start is None:
+            return 0
+        node, start = self.ponder_start
+        if root is not node and root not in node.children:
+            return 0
+        return root.visits - start.get(root, 0)
+
+    def opponent_moved(self, board, move):
+        # Appelé par play_game quand l'adversaire a joué (move None : il a passé) ;
+        # l'arbre est retrouvé par la réutilisation habituelle au prochain get_move
+        self.finish_pondering()
+
+    def stop_pondering(self):
+        # Fin de partie : réflexion abandonnée et processus arrêté
+        parallel_mcts.stop_pondering(self)
+        self.ponder_node = self.ponder_start = None
 
-    def get_move(self, board):
-        root = Node(copy.deepcopy(board), player=self.color)
+    def search_arrays(self, board, simulations, time_limit=None):
+        # Même algorithme que search, mais l'arbre est un ArrayTree et le
+        # plateau est rejoué depuis la racine à chaque simulation
+        tree = None
+        if self.reuse_tree and self.tree is not None:
+            old_tree, root_board = self.tree
+            node = old_tree.find_grandchild(self.engine, root_board, self.color, board)
+            if node is not None:
+                tree = old_tree.extract(node)
+        if tree is None:
+            tree = ArrayTree(self.max_nodes)
+        self.reused_visits = tree.visits[0]
+        board = copy.deepcopy(board)
 
-        for _ in range(self.simulations):
-            node = root
+        budget = SearchBudget(simulations, time_limit, self.early_stop, self.batch)
+        while budget.running(lambda: [tree.visits[c] for c in tree.tried_children(0)]):
+            node = 0
+            player = self.color
+            path = []  # (joueur, coup, pions retournés) pour revenir à la racine
 
-            # SELECTION
-            while node.is_fully_expanded() and node.children:
-                node = node.best_child()
+            while True:
+                if tree.first_child[node] == NOT_GENERATED \
+                        and not tree.generate(node, self.root_moves(board) if node == 0
+                                              else self.engine.valid_moves(board, player)):
+                    break  # plafond de nœuds atteint : on simule depuis ce nœud
+                tried = tree.n_tried[node]
+                expanding = tried < tree.n_children[node]
+                if expanding:
+                    # EXPANSION (coups non essayés dans l'ordre, comme Node.expand)
+                    child = tree.first_child[node] + tried
+                    tree.n_tried[node] = tried + 1
+                elif tree.n_children[node]:
+                    # SELECTION
+                    child = tree.best_child(node)
+                else:
+                    break
+                move = tree.square(child)
+                path.append((player, move, self.engine.make_move(board, player, *move)))
+                node = child
+                player = opponent(player)
+                if expanding:
+                    break
 
-            # EXPANSION
-            if not node.is_fully_expanded():
-                node = node.expand()
+            # SIMULATION puis BACKPROPAGATION
+            result, count = self.playouts(board, player)
+            tree.backpropagate(node, result, count=count)
+            while path:
+                played, move, flipped = path.pop()
+                self.engine.undo_move(board, played, *move, flipped)
 
-            # SIMULATION
-            result = self.simulate(node)
+        self.simulations_used = budget.used
+        self.tree = (tree, board) if self.reuse_tree else None
+        return tree
 
-            # BACKPROPAGATION
-            while node:
-                node.update(result)
-                node = node.parent
+    def root_moves(self, board):
+        # Coups à la racine : les coups symétriques (position symétrique,
+        # comme au départ) mènent à la même partie et ne sont cherchés qu'une fois
+        moves = self.engine.valid_moves(board, self.color)
+        return unique_moves(board, moves) if self.merge_symmetric else moves
 
-        # Meilleur coup choisi
-        best_child = max(root.children, key=lambda c: c.visits)
-        return (best_child.move[0], best_child.move[1])
+    def simulate(self, node, played=None):
+        current_player = self.color if node.move is None else opponent(node.move[2])
+        return self.playouts(node.state, current_player, played)
 
+    def playouts(self, board, current_player, played=None):
+        # (victoires, parties) : une partie ou un lot de self.batch parties
+        if self.batch > 1:
+            return leaf_wins(board, current_player, self.batch, self.color, draw=0,
+                             rng=self.rng), self.batch
+        return self.rollout(board, current_player, played), 1
 
-    def simulate(self, node):
-        board = copy.deepcopy(node.state)
-        current_player = self.color if node.move is None else opponent(node.move[1])
+    def rollout(self, board, current_player, played=None):
+        # On joue directement sur le plateau puis on défait les coups ;
+        # played reçoit les coups (x, y, joueur) joués (pour RAVE).
+        # Mêmes règles que batch_rollout : un joueur sans coup passe, la
+        # partie s'arrête quand les deux joueurs passent de suite
+        undo_stack = []
+        passes = 0
 
-        while valid_moves(board, current_player):
-            moves = valid_moves(board, current_player)
-            move = random.choice(moves)
-            make_move(board, current_player, *move)
+        while passes < 2:
+            moves = self.engine.valid_moves(board, current_player)
+            if moves:
+                passes = 0
+                move = self.rng.choice(moves)
+                flipped = self.engine.make_move(board, current_player, *move)
+                undo_stack.append((current_player, move, flipped))
+                if played is not None:
+                    played.append((move[0], move[1], current_player))
+            else:
+                passes += 1
             current_player = opponent(current_player)
 
-        black_score, white_score = count_pieces(board)
+        black_score, white_score = self.engine.count_pieces(board)
+        while undo_stack:
+            player, move, flipped = undo_stack.pop()
+            self.engine.undo_move(board, player, *move, flipped)
         if self.color == "B":
             return 1 if black_score > white_score else 0
         else:
@@ -1,10 +1,19 @@
-from board import valid_moves, make_move, count_pieces
+import board as board_engine
+import parallel_mcts
+from mcts_tree import ArrayTree, NOT_GENERATED
+from endgame import endgame_move
+from instrument import record_stats
+from batch_rollout import leaf_wins
+from opening_book import book_move, open_book
+from symmetry import unique_moves
+from search_budget import SearchBudget
 import copy
+import importlib
 import random
 import math
 
 class MCTSNode:
-    def __init__(self, board, color, parent=None, move=None):
+    def __init__(self, board, color, parent=None, move=None, engine=board_engine):
         """
         Initialize a node in the Monte Carlo search tree.
         
@@ -13,22 +22,45 @@ class MCTSNode:
             color: The player's color at this node ('B' or 'W')
             parent: The parent node
             move: The move that led to this node
+            engine: Board module to use (board or bitboard)
         """
         self.board = board
+        self.engine = engine
         self.color = color
         self.parent = parent
         self.move = move
         self.children = []
         self.visits = 0
         self.wins = 0
-        self.unexplored_moves = valid_moves(board, color)
+        # RAVE/AMAF statistics: this move played later in a simulation
+        self.amaf_visits = 0
+        self.amaf_wins = 0
+        self.unexplored_moves = engine.valid_moves(board, color)
+    
+    def __getstate__(self):
+        """Replace the engine module by its name so the node can be sent to a process."""
+        state = self.__dict__.copy()
+        state['engine'] = self.engine.__name__
+        return state
+    
+    def __setstate__(self, state):
+        state['engine'] = importlib.import_module(state['engine'])
+        self.__dict__.update(state)
         
     def fully_expanded(self):
         """Check if all possible moves from this state have been explored."""
         return len(self.unexplored_moves) == 0
     
-    def select_child(self):
-        """Select a child node using the UCB1 formula."""
+    def select_child(self, rave=None):
+        """
+        Select a child node using the UCB1 formula.
+        
+        Args:
+            rave: RAVE equivalence constant k, or None for plain UCB1. The
+                AMAF win rate is blended in with weight
+                beta = sqrt(k / (3 * visits + k)), which fades as the
+                child gets visits of its own.
+        """
         # UCB1 formula: wins/visits + C * sqrt(ln(parent_visits) / visits)
         C = 1.41  # Exploration parameter
         
@@ -41,6 +73,9 @@ class MCTSNode:
                 return child
                 
             exploitation = child.wins / child.visits
+            if rave and child.amaf_visits:
+                beta = math.sqrt(rave / (3 * child.visits + rave))
+                exploitation = (1 - beta) * exploitation + beta * child.amaf_wins / child.amaf_visits
             exploration = math.sqrt(math.log(self.visits) / child.visits)
             score = exploitation + C * exploration
             
@@ -50,125 +85,509 @@ class MCTSNode:
                 
         return best_child
     
-    def expand(self):
-        """Expand the tree by adding a new child node."""
+    def expand(self, rng=random):
+        """
+        Expand the tree by adding a new child node.
+        
+        Args:
+            rng: Random source choosing the move (the random module by default)
+        """
         if not self.unexplored_moves:
             return None
             
         # Choose a random unexplored move
-        move = random.choice(self.unexplored_moves)
+        move = rng.choice(self.unexplored_moves)
         self.unexplored_moves.remove(move)
         
         # Create a new board with this move
         new_board = copy.deepcopy(self.board)
         opponent_color = 'W' if self.color == 'B' else 'B'
-        make_move(new_board, self.color, *move)
+        self.engine.make_move(new_board, self.color, *move)
         
         # Create and return the new child node
-        child = MCTSNode(new_board, opponent_color, parent=self, move=move)
+        child = MCTSNode(new_board, opponent_color, parent=self, move=move, engine=self.engine)
         self.children.append(child)
         return child
     
-    def update(self, result):
-        """Update the node statistics based on simulation result."""
-        self.visits += 1
+    def update(self, result, count=1):
+        """Update the node statistics based on the result of count simulations."""
+        self.visits += count
         self.wins += result
+    
+    def update_amaf(self, played, result):
+        """
+        Update the AMAF statistics of the children whose move this node's
+        player made later in the simulation.
+        
+        Args:
+            played: Set of (row, col, color) moves played below this node
+            result: Simulation result for this node's player
+        """
+        for child in self.children:
+            if (child.move[0], child.move[1], self.color) in played:
+                child.amaf_visits += 1
+                child.amaf_wins += result
 
 
 class MCTSAgentRomain:
-    def __init__(self, color, iterations=1000):
+    def __init__(self, color, iterations=1000, engine=board_engine, workers=1, reuse_tree=True,
+                 storage='nodes', max_nodes=None, endgame_empties=None, batch=1,
+                 book=None, merge_symmetric=True, time_limit=None, early_stop=True, rave=None,
+                 pondering=False):
         """
         Initialize the Monte Carlo Tree Search agent.
         
         Args:
             color: The color that the agent is playing ('B' or 'W')
-            iterations: The number of iterations to run MCTS
+            iterations: The number of iterations to run MCTS (None: time_limit only)
+            engine: Board module to use (board or bitboard)
+            workers: Number of processes growing independent trees (root parallelism)
+            reuse_tree: Whether to keep the search tree from one move to the next
+            storage: 'nodes' for MCTSNode objects, 'arrays' for a compact ArrayTree
+            max_nodes: Node cap of the ArrayTree (None for no cap)
+            endgame_empties: Solve exactly when this few squares are empty (None: never)
+            batch: Random games played together from each expanded leaf
+            book: OpeningBook, or path of a book file, looked up before searching
+            merge_symmetric: Search only one of the root moves that are images of
+                each other under a symmetry of the position
+            time_limit: Seconds per move (None: iterations only)
+            early_stop: Stop once the most visited root move can no longer change
+            rave: RAVE/AMAF equivalence constant k (None: plain UCB1); needs
+                storage='nodes' and batch=1
+            pondering: Keep growing the tree during the opponent's turn, in a
+                separate process (see ponder); the work already done under the
+                new root then counts in the budget. Needs storage='nodes' and
+                workers=1
         """
+        if rave and (storage != 'nodes' or batch > 1):
+            raise ValueError("rave needs storage='nodes' and batch=1")
         self.color = color
         self.opponent_color = 'W' if color == 'B' else 'B'
         self.iterations = iterations
+        self.time_limit = time_limit
+        self.early_stop = early_stop
+        self.simulations_used = 0
+        self.engine = engine
+        self.workers = workers
+        self.pool = None
+        self.reuse_tree = reuse_tree
+        self.tree = None
+        self.storage = storage
+        self.max_nodes = max_nodes
+        self.reused_visits = 0
+        self.endgame_empties = endgame_empties
+        self.batch = batch
+        self.book = open_book(book)
+        self.merge_symmetric = merge_symmetric
+        self.rave = rave
+        self.pondering = pondering
+        self.ponder_pool = None
+        self.ponder_signal = None
+        self.ponder_future = None
+        self.ponder_node = None
+        self.ponder_start = None
+        self.pondered = 0
+        self.ponder_seconds = 0.0
+        # Own random source, seeded from the random module so that games
+        # played after random.seed stay reproducible
+        self.rng = random.Random(random.getrandbits(64))
+        self.stats = {}
+    
+    def __getstate__(self):
+        """Replace the engine module by its name so the agent can be sent to a worker."""
+        state = self.__dict__.copy()
+        state['engine'] = self.engine.__name__
+        state['pool'] = None
+        state['tree'] = None
+        state['ponder_pool'] = None
+        state['ponder_signal'] = None
+        state['ponder_future'] = None
+        state['ponder_node'] = None
+        state['ponder_start'] = None
+        return state
+    
+    def __setstate__(self, state):
+        state['engine'] = importlib.import_module(state['engine'])
+        self.__dict__.update(state)
+    
+    def close(self):
+        """Shut down the worker and pondering processes, if any."""
+        self.stop_pondering()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
     
-    def get_move(self, board):
+    @record_stats
+    def get_move(self, board, time_limit=None, iterations=None):
         """
         Get the best move according to MCTS.
         
         Args:
             board: The current game board
+            time_limit: Seconds for this move (overrides the agent's budget)
+            iterations: Iterations for this move (overrides the agent's budget)
             
         Returns:
             The best move as a tuple (row, col) or None if no moves are available
+            (stats['simulations'] is the number of iterations actually run)
         """
-        moves = valid_moves(board, self.color)
+        moves = self.engine.valid_moves(board, self.color)
+        self.stats['moves'] = len(moves)
         if not moves:
             return None
         
-        # Create the root node
-        root = MCTSNode(copy.deepcopy(board), self.color)
+        # Known opening position: play the book move
+        move = book_move(board, self.color, self.engine, self.book, self.stats)
+        if move is not None:
+            return move
+        
+        # Few empty squares left: play the perfect move instead
+        move = endgame_move(board, self.color, self.engine, self.endgame_empties, self.stats)
+        if move is not None:
+            return move
+        
+        # A single move (up to symmetry): no need to search
+        root_moves = self._root_moves(board)
+        if len(root_moves) == 1:
+            self.tree = None
+            self.stats['simulations'] = 0
+            return root_moves[0]
+        
+        if iterations is None and time_limit is None:
+            iterations, time_limit = self.iterations, self.time_limit
+        if self.workers > 1:
+            visits = parallel_mcts.merged_root_visits(self, board, iterations, time_limit)
+        else:
+            visits = self.root_visits(board, iterations, time_limit)
+        self.stats.update(simulations=self.simulations_used, workers=self.workers,
+                          rollouts=self.simulations_used * self.batch,
+                          reused_visits=self.reused_visits)
+        
+        # Choose the move with the highest visit count (first move by default)
+        return max(visits, key=visits.get) if visits else moves[0]
+    
+    def root_visits(self, board, iterations, time_limit=None):
+        """
+        Run MCTS and return the visit count of every root child.
         
-        # Run MCTS for the specified number of iterations
-        for _ in range(self.iterations):
-            # Selection
-            node = root
-            while not node.fully_expanded() and node.children:
-                node = node.select_child()
+        Args:
+            board: The current game board
+            iterations: The maximum number of iterations to run (None: no maximum)
+            time_limit: Seconds available (None: no limit)
             
-            # Expansion
-            if not node.fully_expanded():
-                node = node.expand()
-                if node is None:  # No moves to expand
-                    continue
+        Returns:
+            A dict mapping each expanded move to its visit count
+        """
+        if self.storage == 'arrays':
+            return self._search_arrays(board, iterations, time_limit).root_visits()
+        root = self._search(board, iterations, time_limit)
+        return {child.move: child.visits for child in root.children}
+    
+    def _search(self, board, iterations, time_limit=None):
+        """
+        Grow a search tree from the given board.
+        
+        Args:
+            board: The current game board
+            iterations: The maximum number of iterations to run (None: no maximum)
+            time_limit: Seconds available (None: no limit)
             
-            # Simulation
-            result = self._simulate(node.board, node.color)
+        Returns:
+            The root MCTSNode
+        """
+        self._finish_pondering()
+        # Start from the previous tree when possible, otherwise from a new root
+        root = self._reused_root(board)
+        if root is None:
+            root = MCTSNode(copy.deepcopy(board), self.color, engine=self.engine)
+            root.unexplored_moves = self._root_moves(board)
+        self.reused_visits = root.visits
+        pondered = self._pondered_visits(root)
+        if pondered:
+            # Work done under the root while pondering already counts: in
+            # iterations, and in time for the root's share of the pondering
+            if iterations is not None:
+                iterations = max(iterations - pondered // self.batch,
+                                 len(root.unexplored_moves) + 1)
+            if time_limit is not None:
+                share = pondered / (self.pondered * self.batch)
+                time_limit = max(0.0, time_limit - share * self.ponder_seconds)
+        self.ponder_start = None
+        
+        # Run MCTS until the budget is spent or the best move is settled
+        budget = SearchBudget(iterations, time_limit, self.early_stop, self.batch)
+        while budget.running(lambda: [child.visits for child in root.children]):
+            self._iterate(root)
+        
+        self.simulations_used = budget.used
+        self.tree = root if self.reuse_tree else None
+        return root
+    
+    def _iterate(self, root):
+        """
+        Run one MCTS iteration (selection, expansion, simulation,
+        backpropagation) from the given node.
+        
+        Args:
+            root: Node the selection starts from
+        """
+        # Selection
+        node = root
+        while node.fully_expanded() and node.children:
+            node = node.select_child(self.rave)
+        
+        # Expansion
+        if not node.fully_expanded():
+            node = node.expand(self.rng)
+            if node is None:  # No moves to expand
+                return
+        
+        # Simulation
+        played = [] if self.rave else None
+        result, count = self._playouts(node.board, node.color, played)
+        
+        # Backpropagation (with RAVE, every node also credits the children
+        # whose move was played further down in the simulation)
+        seen = set(played) if self.rave else None
+        while node is not None:
+            node.update(result if node.color == self.opponent_color else count - result, count)
+            if seen is not None:
+                node.update_amaf(seen, result if node.color == self.color else count - result)
+                if node.parent is not None:
+                    seen.add((node.move[0], node.move[1], node.parent.color))
+            node = node.parent
+    
+    def ponder(self, board):
+        """
+        Start pondering (called by play_game after this agent's move): a
+        separate process keeps growing a copy of the subtree of the move
+        just played. With an iteration budget it runs one move's worth of
+        iterations, waited for if the opponent answers sooner, so that
+        seeded games stay reproducible; with a time limit it runs until the
+        opponent has moved.
+        
+        Args:
+            board: The board after this agent's move
+        """
+        if not self.pondering or self.storage != 'nodes' or self.workers > 1 or self.tree is None:
+            return
+        node = next((child for child in self.tree.children if child.board == board), None)
+        if node is None:
+            return
+        # Visit counts of the opponent's replies when pondering starts, by
+        # move since the subtree comes back as a copy
+        self.ponder_node = node
+        self.ponder_start = {child.move: child.visits for child in node.children}
+        iterations = self.iterations if self.time_limit is None else None
+        parallel_mcts.start_pondering(self, node, iterations, '_iterate')
+    
+    def _finish_pondering(self):
+        """Graft the subtree grown by the pondering process back into the tree."""
+        result = parallel_mcts.finish_pondering(self)
+        if result is None:
+            return
+        grown, self.pondered, self.ponder_seconds = result
+        node, self.ponder_node = self.ponder_node, None
+        grown.parent = node.parent
+        siblings = node.parent.children
+        siblings[siblings.index(node)] = grown
+        by_move = self.ponder_start
+        self.ponder_start = (grown, {child: by_move.get(child.move, 0) for child in grown.children})
+    
+    def _pondered_visits(self, root):
+        """
+        Visits added under the root by the last pondering.
+        
+        Args:
+            root: Root of the new search (the opponent's reply in the tree)
+            
+        Returns:
+            The root's visits minus its visits when pondering started (0 for
+            a reply first expanded while pondering), or 0 if the root is not
+            a reply to the pondered move
+        """
+        if self.ponder_start is None:
+            return 0
+        node, start = self.ponder_start
+        if root not in node.children:
+            return 0
+        return root.visits - start.get(root, 0)
+    
+    def opponent_moved(self, board, move):
+        """
+        Called by play_game once the opponent has moved (move is None for a
+        pass). Pondering stops and its subtree is grafted back; the next
+        search finds the new position in the tree as usual.
+        """
+        self._finish_pondering()
+    
+    def stop_pondering(self):
+        """Abandon pondering, if any, and stop its process (end of a game)."""
+        parallel_mcts.stop_pondering(self)
+        self.ponder_node = self.ponder_start = None
+    
+    def _reused_root(self, board):
+        """
+        Find the current position in the tree kept from the previous move.
+        
+        Args:
+            board: The current game board
+            
+        Returns:
+            The matching grandchild (our move, then the opponent's reply),
+            detached from its parent, or None if it is not in the tree
+        """
+        if not self.reuse_tree or self.tree is None:
+            return None
+        for child in self.tree.children:
+            for grandchild in child.children:
+                if grandchild.color == self.color and grandchild.board == board:
+                    grandchild.parent = None
+                    grandchild.move = None
+                    return grandchild
+        return None
+    
+    def _search_arrays(self, board, iterations, time_limit=None):
+        """
+        Same search as _search, on an ArrayTree. Node boards are not stored:
+        the moves are replayed from the root and undone after each iteration.
+        
+        Args:
+            board: The current game board
+            iterations: The maximum number of iterations to run (None: no maximum)
+            time_limit: Seconds available (None: no limit)
+            
+        Returns:
+            The ArrayTree, rooted at the given board
+        """
+        tree = None
+        if self.reuse_tree and self.tree is not None:
+            old_tree, root_board = self.tree
+            node = old_tree.find_grandchild(self.engine, root_board, self.color, board)
+            if node is not None:
+                tree = old_tree.extract(node)
+        if tree is None:
+            tree = ArrayTree(self.max_nodes)
+        self.reused_visits = tree.visits[0]
+        board = copy.deepcopy(board)
+        
+        budget = SearchBudget(iterations, time_limit, self.early_stop, self.batch)
+        while budget.running(lambda: [tree.visits[c] for c in tree.tried_children(0)]):
+            node = 0
+            color = self.color
+            path = []  # (color, move, flipped) to undo back to the root
+            
+            while True:
+                # Children are generated the first time a node is reached
+                if tree.first_child[node] == NOT_GENERATED \
+                        and not tree.generate(node, self._root_moves(board) if node == 0
+                                              else self.engine.valid_moves(board, color)):
+                    break  # Node cap reached: simulate from here
+                first = tree.first_child[node]
+                tried = tree.n_tried[node]
+                expanding = tried < tree.n_children[node]
+                if expanding:
+                    # Expansion: bring a random unexplored move to the front
+                    tree.swap_moves(first + self.rng.randrange(tried, tree.n_children[node]),
+                                    first + tried)
+                    child = first + tried
+                    tree.n_tried[node] = tried + 1
+                elif tree.n_children[node]:
+                    # Selection
+                    child = tree.best_child(node)
+                else:
+                    break
+                move = tree.square(child)
+                path.append((color, move, self.engine.make_move(board, color, *move)))
+                node = child
+                color = 'W' if color == 'B' else 'B'
+                if expanding:
+                    break
             
-            # Backpropagation
-            while node is not None:
-                node.update(result if node.color == self.opponent_color else 1 - result)
-                node = node.parent
+            # Simulation, then backpropagation from the point of view of
+            # the player who moved into each node
+            result, count = self._playouts(board, color)
+            tree.backpropagate(node, result if color == self.opponent_color else count - result,
+                               alternate=True, count=count)
+            while path:
+                played_color, move, flipped = path.pop()
+                self.engine.undo_move(board, played_color, *move, flipped)
         
-        # Choose the move with the highest visit count
-        best_visits = -1
-        best_move = moves[0]  # Default to first move
+        self.simulations_used = budget.used
+        self.tree = (tree, board) if self.reuse_tree else None
+        return tree
+    
+    def _root_moves(self, board):
+        """
+        Legal moves at the root, keeping one move per class of symmetric
+        moves when merge_symmetric is set (they lead to the same game).
         
-        for child in root.children:
-            if child.visits > best_visits:
-                best_visits = child.visits
-                best_move = child.move
+        Args:
+            board: The current game board
+            
+        Returns:
+            List of moves as (row, col) tuples
+        """
+        moves = self.engine.valid_moves(board, self.color)
+        return unique_moves(board, moves) if self.merge_symmetric else moves
+    
+    def _playouts(self, board, color, played=None):
+        """
+        Run the simulations of one iteration: a single _simulate game, or a
+        batch of self.batch random games played in lockstep.
         
-        return best_move
+        Args:
+            board: The current game board
+            color: The color to move next ('B' or 'W')
+            played: List receiving the (row, col, color) moves of the game (RAVE)
+            
+        Returns:
+            (result, count): total result for the agent and number of games
+        """
+        if self.batch > 1:
+            return leaf_wins(board, color, self.batch, self.color, rng=self.rng), self.batch
+        return self._simulate(board, color, played), 1
     
-    def _simulate(self, board, color):
+    def _simulate(self, board, color, played=None):
         """
         Simulate a random game from the current board state.
         
         Args:
             board: The current game board
             color: The color to move next ('B' or 'W')
+            played: List receiving the (row, col, color) moves played, or None
             
         Returns:
             1 if the agent wins, 0 if it loses, 0.5 for a draw
         """
-        board_copy = copy.deepcopy(board)
+        # Play on the node's board and undo every move afterwards
+        undo_stack = []
         current_color = color
         
         # Play until the game is over
         no_move_count = 0
         while no_move_count < 2:  # Game ends when both players pass
-            moves = valid_moves(board_copy, current_color)
+            moves = self.engine.valid_moves(board, current_color)
             
             if not moves:
                 no_move_count += 1
             else:
                 no_move_count = 0
                 # Make a random move
-                move = random.choice(moves)
-                make_move(board_copy, current_color, *move)
+                move = self.rng.choice(moves)
+                flipped = self.engine.make_move(board, current_color, *move)
+                undo_stack.append((current_color, move, flipped))
+                if played is not None:
+                    played.append((move[0], move[1], current_color))
             
             # Switch player
             current_color = 'W' if current_color == 'B' else 'B'
         
         # Count pieces to determine the winner
-        black_count, white_count = count_pieces(board_copy)
+        black_count, white_count = self.engine.count_pieces(board)
+        while undo_stack:
+            played_color, move, flipped = undo_stack.pop()
+            self.engine.undo_move(board, played_color, *move, flipped)
         
         if self.color == 'B':
             if black_count > white_count:
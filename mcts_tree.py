@@ -0,0 +1,165 @@
+"""
+Struct-of-arrays search tree for the MCTS agents.
+
+Node i is the i-th entry of a few parallel arrays instead of an object
+holding its own board copy. The children of a node are contiguous:
+first_child[i] .. first_child[i] + n_children[i] - 1, and the first
+n_tried[i] of them are the ones already expanded. Boards are not stored:
+the agents replay the moves from the root along the selection path.
+"""
+
+import math
+import sys
+from array import array
+
+from board import opponent
+
+NOT_GENERATED = -1  # children of the node not generated yet
+ROOT_MOVE = -1
+
+
+class ArrayTree:
+    def __init__(self, max_nodes=None, capacity=1024):
+        """
+        Args:
+            max_nodes: Node cap; nodes that would exceed it are not created
+            capacity: Number of nodes preallocated, doubled when full
+        """
+        self.max_nodes = max_nodes
+        self.size = 0
+        self.visits = array("i", bytes(4 * capacity))
+        self.wins = array("d", bytes(8 * capacity))
+        self.parent = array("i", bytes(4 * capacity))
+        self.first_child = array("i", bytes(4 * capacity))
+        self.n_children = array("B", bytes(capacity))
+        self.n_tried = array("B", bytes(capacity))
+        self.move = array("b", bytes(capacity))  # square x * 8 + y
+        self._add(NOT_GENERATED, ROOT_MOVE)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        for column in (self.visits, self.wins, self.parent, self.first_child,
+                       self.n_children, self.n_tried, self.move):
+            column.extend(column)
+
+    def _add(self, parent, move):
+        if self.size == len(self.visits):
+            self._grow()
+        i = self.size
+        self.visits[i] = 0
+        self.wins[i] = 0.0
+        self.parent[i] = parent
+        self.first_child[i] = NOT_GENERATED
+        self.n_children[i] = 0
+        self.n_tried[i] = 0
+        self.move[i] = move
+        self.size += 1
+        return i
+
+    def generate(self, node, moves):
+        """Create the (unvisited) children of node; False if over the node cap."""
+        if self.max_nodes is not None and self.size + len(moves) > self.max_nodes:
+            return False
+        self.first_child[node] = self.size
+        self.n_children[node] = len(moves)
+        for x, y in moves:
+            self._add(node, x * 8 + y)
+        return True
+
+    def square(self, node):
+        """The move leading to node as an (x, y) tuple."""
+        return divmod(self.move[node], 8)
+
+    def swap_moves(self, a, b):
+        """Swap the moves of two unvisited sibling nodes."""
+        self.move[a], self.move[b] = self.move[b], self.move[a]
+
+    def tried_children(self, node):
+        first = self.first_child[node]
+        if first == NOT_GENERATED:
+            return range(0)
+        return range(first, first + self.n_tried[node])
+
+    def best_child(self, node, exploration=1.41):
+        """UCB1 over the expanded children of node."""
+        log_visits = math.log(self.visits[node])
+        visits, wins = self.visits, self.wins
+        best_score = float("-inf")
+        best = None
+        for child in self.tried_children(node):
+            score = wins[child] / visits[child] \
+                + exploration * math.sqrt(log_visits / visits[child])
+            if score > best_score:
+                best_score = score
+                best = child
+        return best
+
+    def backpropagate(self, node, result, alternate=False, count=1):
+        """
+        Add result, the total of count playouts, to node and its ancestors.
+        With alternate, result is from the point of view of the player who
+        moved into node and is flipped (count - result) at each level up.
+        """
+        while node != NOT_GENERATED:
+            self.visits[node] += count
+            self.wins[node] += result
+            if alternate:
+                result = count - result
+            node = self.parent[node]
+
+    def root_visits(self):
+        """{(x, y): visits} for the expanded root children, in expansion order."""
+        return {self.square(child): self.visits[child] for child in self.tried_children(0)}
+
+    def find_grandchild(self, engine, root_board, color, board):
+        """
+        Index of the node two plies below the root (color's move then the
+        opponent's reply) whose position equals board, or None.
+        """
+        for child in self.tried_children(0):
+            move = self.square(child)
+            flipped = engine.make_move(root_board, color, *move)
+            found = None
+            for grandchild in self.tried_children(child):
+                reply = self.square(grandchild)
+                reply_flipped = engine.make_move(root_board, opponent(color), *reply)
+                if root_board == board:
+                    found = grandchild
+                engine.undo_move(root_board, opponent(color), *reply, reply_flipped)
+                if found is not None:
+                    break
+            engine.undo_move(root_board, color, *move, flipped)
+            if found is not None:
+                return found
+        return None
+
+    def extract(self, node):
+        """Copy the subtree below node into a new tree where it is the root."""
+        tree = ArrayTree(self.max_nodes, capacity=max(1024, self.size))
+        tree.visits[0] = self.visits[node]
+        tree.wins[0] = self.wins[node]
+        stack = [(node, 0)]
+        while stack:
+            old, new = stack.pop()
+            first = self.first_child[old]
+            if first == NOT_GENERATED:
+                continue
+            tree.first_child[new] = tree.size
+            tree.n_children[new] = self.n_children[old]
+            tree.n_tried[new] = self.n_tried[old]
+            for child in range(first, first + self.n_children[old]):
+                i = tree._add(new, self.move[child])
+                tree.visits[i] = self.visits[child]
+                tree.wins[i] = self.wins[child]
+                stack.append((child, i))
+        return tree
+
+    def memory_bytes(self):
+        return sum(sys.getsizeof(column) for column in (
+            self.visits, self.wins, self.parent, self.first_child,
+            self.n_children, self.n_tried, self.move))
+
+    def bytes_per_node(self):
+        return self.memory_bytes() / self.size
@@ -1,67 +1,341 @@
 import copy
-from board import valid_moves, make_move, opponent, EMPTY, BOARD_SIZE
+import importlib
+import time
+import board as board_engine
+import parallel_search
+from board import opponent, ZOBRIST_SIDE
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from endgame import endgame_move
+from instrument import record_stats, effective_branching
+from pattern_eval import default_evaluator
+from opening_book import book_move, open_book
+
+INF = float("inf")
+MAX_PLY = 128
+
+class SearchTimeout(Exception):
+    pass
 
 class MinimaxAgent:
-    def __init__(self, color, depth=3):
+    def __init__(self, color, depth=3, engine=board_engine, search="minimax", tt_size=1 << 16,
+                 endgame_empties=None, evaluator=None, book=None, workers=1):
         self.color = color
         self.depth = depth
+        self.engine = engine
+        # "minimax" : profondeur fixe ; "alphabeta" : PVS + approfondissement itératif
+        self.search = search
+        self.tt_size = tt_size
+        self.tt = TranspositionTable(tt_size)  # conservée d'un coup à l'autre, pour les deux modes
+        self.workers = workers  # > 1 : coups racine répartis entre processus
+        self.pool = None
+        self.stats = {}
+        self.endgame_empties = endgame_empties  # résolution exacte sous ce nombre de cases vides
+        # évaluation par motifs (tables chargées avec PatternEvaluator.load si besoin)
+        self.evaluator = evaluator or default_evaluator()
+        self.book = open_book(book)  # bibliothèque d'ouvertures (fichier ou OpeningBook)
+
+    def __getstate__(self):
+        # Envoi aux processus : moteur par son nom, sans pool ni table
+        # (chaque processus a la sienne) ni tables d'évaluation par défaut
+        state = self.__dict__.copy()
+        state["engine"] = self.engine.__name__
+        state["pool"] = None
+        state["tt"] = None
+        if self.evaluator is default_evaluator():
+            state["evaluator"] = None
+        return state
+
+    def __setstate__(self, state):
+        state["engine"] = importlib.import_module(state["engine"])
+        state["tt"] = TranspositionTable(state["tt_size"])
+        state["evaluator"] = state["evaluator"] or default_evaluator()
+        self.__dict__.update(state)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
 
-    def get_move(self, board):
-        moves = valid_moves(board, self.color)
+    @record_stats
+    def get_move(self, board, time_limit=None):
+        move = book_move(board, self.color, self.engine, self.book, self.stats)
+        if move is not None:
+            return move
+        move = endgame_move(board, self.color, self.engine, self.endgame_empties, self.stats)
+        if move is not None:
+            return move
+        if self.workers > 1:
+            return self.parallel_deepening(board, time_limit)
+        if time_limit is not None or self.search == "alphabeta":
+            return self.iterative_deepening(board, time_limit)
+
+        moves = self.engine.valid_moves(board, self.color)
         if not moves:
             return None
+        self.nodes = 1
 
         best_score = float("-inf")
         best_move = None
 
+        board = copy.deepcopy(board)  # plateau de travail, joué puis défait
+        key = self.engine.zobrist_hash(board, self.color)
+        probes, hits = self.tt.probes, self.tt.hits
         for move in moves:
-            new_board = copy.deepcopy(board)
-            make_move(new_board, self.color, *move)
-            score = self.minimax(new_board, self.depth - 1, False, opponent(self.color))
+            flipped = self.engine.make_move(board, self.color, *move)
+            score = self.minimax(board, self.depth - 1, False, opponent(self.color),
+                                 self.engine.zobrist_move(key, self.color, *move, flipped))
+            self.engine.undo_move(board, self.color, *move, flipped)
             if score > best_score:
                 best_score = score
                 best_move = move
 
+        probes, hits = self.tt.probes - probes, self.tt.hits - hits
+        self.stats.update(moves=len(moves), depth=self.depth, nodes=self.nodes, score=best_score,
+                          branching=effective_branching(self.nodes, self.depth),
+                          tt_hits=hits, tt_hit_rate=hits / probes if probes else 0.0)
         return best_move
 
-    def minimax(self, board, depth, maximizing, current_color):
-        moves = valid_moves(board, current_color)
-
-        if depth == 0 or not moves:
+    def minimax(self, board, depth, maximizing, current_color, key):
+        # Score du point de vue de self.color. Sans élagage tous les scores sont
+        # exacts : la table les garde, comme negamax, du point de vue du joueur au
+        # trait (sign), et les passes sont jouées comme dans negamax
+        self.nodes += 1
+        if depth == 0:
             return self.evaluate(board)
+        sign = 1 if maximizing else -1
+        entry = self.tt.probe(key)
+        if entry is not None and entry[1] >= depth and entry[2] == EXACT:
+            return sign * entry[3]
 
+        moves = self.engine.valid_moves(board, current_color)
+        opp = opponent(current_color)
+        if not moves:
+            if not self.engine.valid_moves(board, opp):
+                return self.evaluate(board)
+            return self.minimax(board, depth - 1, not maximizing, opp, key ^ ZOBRIST_SIDE)
+
+        best_move = None
         if maximizing:
             max_eval = float("-inf")
             for move in moves:
-                new_board = copy.deepcopy(board)
-                make_move(new_board, current_color, *move)
-                eval = self.minimax(new_board, depth - 1, False, opponent(current_color))
-                max_eval = max(max_eval, eval)
-            return max_eval
+                flipped = self.engine.make_move(board, current_color, *move)
+                eval = self.minimax(board, depth - 1, False, opp,
+                                    self.engine.zobrist_move(key, current_color, *move, flipped))
+                self.engine.undo_move(board, current_color, *move, flipped)
+                if eval > max_eval:
+                    max_eval, best_move = eval, move
+            best = max_eval
         else:
             min_eval = float("inf")
             for move in moves:
-                new_board = copy.deepcopy(board)
-                make_move(new_board, current_color, *move)
-                eval = self.minimax(new_board, depth - 1, True, opponent(current_color))
-                min_eval = min(min_eval, eval)
-            return min_eval
+                flipped = self.engine.make_move(board, current_color, *move)
+                eval = self.minimax(board, depth - 1, True, opp,
+                                    self.engine.zobrist_move(key, current_color, *move, flipped))
+                self.engine.undo_move(board, current_color, *move, flipped)
+                if eval < min_eval:
+                    min_eval, best_move = eval, move
+            best = min_eval
+        self.tt.store(key, depth, EXACT, sign * best, best_move)
+        return best
+
+    def iterative_deepening(self, board, time_limit=None):
+        # Sans limite de temps on s'arrête à self.depth, sinon on va aussi
+        # loin que le temps le permet (au plus le nombre de cases vides)
+        start = time.perf_counter()
+        self.reset_search(time_limit)
+
+        moves = self.engine.valid_moves(board, self.color)
+        if not moves:
+            return None
+
+        board = copy.deepcopy(board)
+        black, white = self.engine.count_pieces(board)
+        max_depth = self.depth if time_limit is None else 64 - black - white
+        key = self.engine.zobrist_hash(board, self.color)
+        probes, hits = self.tt.probes, self.tt.hits
+
+        best_move, best_score, reached = moves[0], None, 0
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self.negamax(board, depth, -INF, INF, self.color, 0, True, key)
+            except SearchTimeout:
+                break
+            self.prev_pv = self.pv_table[0]
+            best_move, best_score, reached = self.prev_pv[0], score, depth
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                break
+
+        probes, hits = self.tt.probes - probes, self.tt.hits - hits
+        self.stats.update(moves=len(moves), depth=reached, nodes=self.nodes, score=best_score,
+                          pv=self.prev_pv, search_time=time.perf_counter() - start,
+                          branching=effective_branching(self.nodes, reached),
+                          tt_hits=hits, tt_hit_rate=hits / probes if probes else 0.0)
+        return best_move
+
+    def reset_search(self, time_limit=None):
+        # État d'une nouvelle recherche (la table de transposition est gardée)
+        self.deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+        self.prev_pv = []
+
+    def parallel_deepening(self, board, time_limit=None):
+        # Approfondissement itératif dont chaque itération répartit les coups
+        # racine entre les processus (parallel_search.root_split) ; les coups
+        # sont réordonnés d'après les scores de l'itération précédente
+        start = time.perf_counter()
+        moves = self.engine.valid_moves(board, self.color)
+        if not moves:
+            return None
+        alphabeta = time_limit is not None or self.search == "alphabeta"
+        black, white = self.engine.count_pieces(board)
+        max_depth = self.depth if time_limit is None else 64 - black - white
+        depths = range(1, max_depth + 1) if alphabeta else [self.depth]
+
+        best_move, best_score, reached, nodes = moves[0], None, 0, 0
+        for depth in depths:
+            remaining = None
+            if time_limit is not None:
+                remaining = time_limit - (time.perf_counter() - start)
+                if remaining <= 0:
+                    break
+            result = parallel_search.root_split(self, board, moves, depth, remaining,
+                                                young_brothers_wait=alphabeta)
+            if result is None:
+                break
+            scores, searched = result
+            nodes += searched
+            moves = sorted(moves, key=scores.get, reverse=True)
+            best_move, best_score, reached = moves[0], scores[moves[0]], depth
+
+        self.stats.update(moves=len(moves), depth=reached, nodes=nodes, score=best_score,
+                          workers=self.workers, search_time=time.perf_counter() - start,
+                          branching=effective_branching(nodes, reached))
+        return best_move
+
+    def search_root_move(self, board, move, depth, alpha, beta, time_limit=None):
+        # Un coup racine cherché à `depth` (coup compris) dans la fenêtre
+        # (alpha, beta), pour parallel_search : (score, nœuds) ou None si le
+        # temps est écoulé
+        self.reset_search(time_limit)
+        board = copy.deepcopy(board)
+        key = self.engine.zobrist_hash(board, self.color)
+        flipped = self.engine.make_move(board, self.color, *move)
+        opp = opponent(self.color)
+        child_key = self.engine.zobrist_move(key, self.color, *move, flipped)
+        if time_limit is None and self.search == "minimax":
+            self.nodes = 1
+            return self.minimax(board, depth - 1, False, opp, child_key), self.nodes
+        try:
+            score = -self.negamax(board, depth - 1, -beta, -alpha, opp, 1, False, child_key)
+        except SearchTimeout:
+            return None
+        return score, self.nodes
+
+    def score_moves(self, board, moves, depth, pvs=None):
+        # Score exact (fenêtre complète) de chaque coup à `depth` (coup compris)
+        # pour l'analyse multi-PV : [(coup, score, variante)] du meilleur au moins
+        # bon. pvs : {coup: variante} d'une analyse moins profonde, suivies en
+        # premier. À appeler après reset_search ; SearchTimeout si le temps est écoulé
+        board = copy.deepcopy(board)
+        key = self.engine.zobrist_hash(board, self.color)
+        opp = opponent(self.color)
+        lines = []
+        for move in moves:
+            flipped = self.engine.make_move(board, self.color, *move)
+            self.prev_pv = (pvs or {}).get(move, [])[1:]
+            try:
+                score = -self.negamax(board, depth - 1, -INF, INF, opp, 0, True,
+                                      self.engine.zobrist_move(key, self.color, *move, flipped))
+            finally:
+                self.engine.undo_move(board, self.color, *move, flipped)
+            lines.append((move, score, [move] + self.pv_table[0]))
+        lines.sort(key=lambda line: line[1], reverse=True)
+        return lines
+
+    def negamax(self, board, depth, alpha, beta, color, ply, on_pv, key):
+        # Score du point de vue de `color` ; PVS avec fenêtre nulle après le premier coup
+        self.nodes += 1
+        if self.deadline is not None and self.nodes & 1023 == 0 \
+                and time.perf_counter() >= self.deadline:
+            raise SearchTimeout
+        self.pv_table[ply] = []
+        sign = 1 if color == self.color else -1
+        if depth == 0:
+            return sign * self.evaluate(board)
+
+        # Table de transposition (jamais de coupure à la racine : il faut la PV)
+        entry = self.tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                bound, tt_score = entry[2], entry[3]
+                if bound == EXACT or (bound == LOWER and tt_score >= beta) \
+                        or (bound == UPPER and tt_score <= alpha):
+                    return tt_score
+
+        opp = opponent(color)
+        moves = self.engine.valid_moves(board, color)
+        if not moves:
+            if not self.engine.valid_moves(board, opp):
+                return sign * self.evaluate(board)
+            # Passe : notée None dans la variante, qui reste alignée sur les plis
+            score = -self.negamax(board, depth - 1, -beta, -alpha, opp, ply + 1, on_pv, key ^ ZOBRIST_SIDE)
+            self.pv_table[ply] = [None] + self.pv_table[ply + 1]
+            return score
+
+        hint = self.prev_pv[ply] if on_pv and ply < len(self.prev_pv) else None
+        moves = self.order_moves(moves, color, ply, hint, tt_move)
+
+        alpha_orig = alpha
+        best, best_move = -INF, None
+        for i, move in enumerate(moves):
+            flipped = self.engine.make_move(board, color, *move)
+            child_key = self.engine.zobrist_move(key, color, *move, flipped)
+            try:
+                if i == 0:
+                    score = -self.negamax(board, depth - 1, -beta, -alpha, opp, ply + 1, move == hint,
+                                          child_key)
+                else:
+                    score = -self.negamax(board, depth - 1, -alpha - 1, -alpha, opp, ply + 1, False,
+                                          child_key)
+                    if alpha < score < beta:
+                        score = -self.negamax(board, depth - 1, -beta, -alpha, opp, ply + 1, False,
+                                              child_key)
+            finally:
+                self.engine.undo_move(board, color, *move, flipped)
+
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                    if alpha >= beta:
+                        killers = self.killers[ply]
+                        if killers[0] != move:
+                            killers[1], killers[0] = killers[0], move
+                        self.history[(color, move)] = self.history.get((color, move), 0) + depth * depth
+                        break
+
+        if best <= alpha_orig:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, bound, best, best_move)
+        return best
+
+    def order_moves(self, moves, color, ply, hint, tt_move=None):
+        # Coup de la variante principale, coup de la table, coups "killer", puis historique
+        killers = self.killers[ply]
+        history = self.history
+        return sorted(moves, key=lambda m: (m == hint, m == tt_move, m in killers,
+                                            history.get((color, m), 0)),
+                      reverse=True)
 
     def evaluate(self, board):
-        # Évaluation simple : score pondéré coins + nombre de pions
-        score = 0
-        for x in range(BOARD_SIZE):
-            for y in range(BOARD_SIZE):
-                if board[x][y] == self.color:
-                    score += 1
-                elif board[x][y] == opponent(self.color):
-                    score -= 1
-
-        # Bonus pour les coins
-        corners = [(0, 0), (0, 7), (7, 0), (7, 7)]
-        for x, y in corners:
-            if board[x][y] == self.color:
-                score += 10
-            elif board[x][y] == opponent(self.color):
-                score -= 10
-        return score
+        return self.evaluator.evaluate(board, self.color)
@@ -1,19 +1,68 @@
-from board import valid_moves, make_move, count_pieces
+import board as board_engine
+import parallel_search
+from board import ZOBRIST_SIDE
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from endgame import endgame_move
+from instrument import record_stats, effective_branching
+from pattern_eval import default_evaluator
+from opening_book import book_move, open_book
 import copy
+import importlib
 
 class MinimaxAgentRomain:
-    def __init__(self, color, depth=3):
+    def __init__(self, color, depth=3, engine=board_engine, tt_size=1 << 16, endgame_empties=None,
+                 evaluator=None, book=None, workers=1):
         """
         Initialize the Minimax agent.
         
         Args:
             color: The color that the agent is playing ('B' or 'W')
             depth: The maximum depth to search in the game tree
+            engine: Board module to use (board or bitboard)
+            tt_size: Number of buckets in the transposition table
+            endgame_empties: Solve exactly when this few squares are empty (None: never)
+            evaluator: PatternEvaluator scoring the leaves (default tables if None)
+            book: OpeningBook, or path of a book file, looked up before searching
+            workers: Number of processes sharing the root moves (parallel_search)
         """
         self.color = color
         self.opponent_color = 'W' if color == 'B' else 'B'
         self.depth = depth
+        self.engine = engine
+        # Kept between moves: scores are always from this agent's point of view
+        self.tt_size = tt_size
+        self.tt = TranspositionTable(tt_size)
+        self.workers = workers
+        self.pool = None
+        self.endgame_empties = endgame_empties
+        self.evaluator = evaluator or default_evaluator()
+        self.book = open_book(book)
+        self.stats = {}
+        self.nodes = 0
     
+    def __getstate__(self):
+        """Send the engine by name, without the pool, the table or the default evaluator."""
+        state = self.__dict__.copy()
+        state['engine'] = self.engine.__name__
+        state['pool'] = None
+        state['tt'] = None
+        if self.evaluator is default_evaluator():
+            state['evaluator'] = None
+        return state
+    
+    def __setstate__(self, state):
+        state['engine'] = importlib.import_module(state['engine'])
+        state['tt'] = TranspositionTable(state['tt_size'])
+        state['evaluator'] = state['evaluator'] or default_evaluator()
+        self.__dict__.update(state)
+    
+    def close(self):
+        """Shut the worker processes down, if any."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+    
+    @record_stats
     def get_move(self, board):
         """
         Get the best move according to the minimax algorithm.
@@ -23,72 +72,162 @@ class MinimaxAgentRomain:
             
         Returns:
             The best move as a tuple (row, col) or None if no moves are available
+            (search statistics are left in self.stats)
         """
-        moves = valid_moves(board, self.color)
+        moves = self.engine.valid_moves(board, self.color)
+        self.stats['moves'] = len(moves)
         if not moves:
             return None
         
+        # Known opening position: play the book move
+        move = book_move(board, self.color, self.engine, self.book, self.stats)
+        if move is not None:
+            return move
+        
+        # Few empty squares left: play the perfect move instead
+        move = endgame_move(board, self.color, self.engine, self.endgame_empties, self.stats)
+        if move is not None:
+            return move
+        
+        # Several workers: the root moves are shared between processes
+        if self.workers > 1:
+            scores, nodes = parallel_search.root_split(self, board, moves, self.depth)
+            best_move = max(moves, key=scores.get)
+            self.stats.update(depth=self.depth, nodes=nodes, score=scores[best_move],
+                              workers=self.workers,
+                              branching=effective_branching(nodes, self.depth))
+            return best_move
+        
+        self.nodes = 1
+        probes, hits = self.tt.probes, self.tt.hits
+        
         best_score = float('-inf')
         best_move = None
         
+        # Work on a single copy: each move is played, searched and undone
+        board = copy.deepcopy(board)
+        key = self.engine.zobrist_hash(board, self.color)
         for move in moves:
-            # Create a copy of the board to simulate the move
-            new_board = copy.deepcopy(board)
-            make_move(new_board, self.color, *move)
+            flipped = self.engine.make_move(board, self.color, *move)
+            child_key = self.engine.zobrist_move(key, self.color, *move, flipped)
             
             # Get the score for this move using minimax
-            score = self._minimax(new_board, self.depth - 1, False)
+            score = self._minimax(board, self.depth - 1, False, child_key, alpha=best_score)
+            self.engine.undo_move(board, self.color, *move, flipped)
             
             if score > best_score:
                 best_score = score
                 best_move = move
         
+        probes, hits = self.tt.probes - probes, self.tt.hits - hits
+        self.stats.update(depth=self.depth, nodes=self.nodes, score=best_score,
+                          branching=effective_branching(self.nodes, self.depth),
+                          tt_hits=hits, tt_hit_rate=hits / probes if probes else 0.0)
         return best_move
     
-    def _minimax(self, board, depth, is_maximizing):
+    def search_root_move(self, board, move, depth, alpha, beta, time_limit=None):
         """
-        Minimax algorithm with alpha-beta pruning.
+        Search a single root move, for parallel_search.
+        
+        Args:
+            board: The current game board
+            move: Root move to search
+            depth: Search depth, the root move included
+            alpha: Lower bound of the window
+            beta: Upper bound of the window
+            time_limit: Ignored (this agent searches to a fixed depth)
+            
+        Returns:
+            (score, nodes): score of the move for the agent, nodes searched
+        """
+        self.nodes = 1
+        board = copy.deepcopy(board)
+        key = self.engine.zobrist_hash(board, self.color)
+        flipped = self.engine.make_move(board, self.color, *move)
+        child_key = self.engine.zobrist_move(key, self.color, *move, flipped)
+        return self._minimax(board, depth - 1, False, child_key, alpha, beta), self.nodes
+    
+    def _minimax(self, board, depth, is_maximizing, key, alpha=float('-inf'), beta=float('inf')):
+        """
+        Minimax algorithm with alpha-beta pruning and a transposition table.
         
         Args:
             board: The current game board
             depth: Current depth in the game tree
             is_maximizing: Whether it's the maximizing player's turn
+            key: Zobrist key of the board with the side to move
+            alpha: Best score the maximizing player is already assured of
+            beta: Best score the minimizing player is already assured of
             
         Returns:
             The best score for the current board position
         """
+        self.nodes += 1
         # If we've reached the maximum depth or the game is over, evaluate the board
         if depth == 0:
             return self._evaluate(board)
         
+        # Reuse a stored result if it was searched at least as deep
+        entry = self.tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                bound, score = entry[2], entry[3]
+                if bound == EXACT or (bound == LOWER and score >= beta) \
+                        or (bound == UPPER and score <= alpha):
+                    return score
+        
         current_color = self.color if is_maximizing else self.opponent_color
-        moves = valid_moves(board, current_color)
+        moves = self.engine.valid_moves(board, current_color)
         
         # If there are no valid moves, pass the turn
         if not moves:
             # If both players pass, the game is over
-            opponent_moves = valid_moves(board, 'W' if current_color == 'B' else 'B')
+            opponent_moves = self.engine.valid_moves(board, 'W' if current_color == 'B' else 'B')
             if not opponent_moves:
                 # Game over, evaluate the final board
                 return self._evaluate(board)
             # Otherwise, pass the turn
-            return self._minimax(board, depth - 1, not is_maximizing)
+            return self._minimax(board, depth - 1, not is_maximizing, key ^ ZOBRIST_SIDE, alpha, beta)
+        
+        # Try the stored best move first
+        if tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
         
         # Initialize the best score
+        alpha_orig, beta_orig = alpha, beta
         best_score = float('-inf') if is_maximizing else float('inf')
+        best_move = None
         
         # Try each move and get the best score
         for move in moves:
-            new_board = copy.deepcopy(board)
-            make_move(new_board, current_color, *move)
-            
-            score = self._minimax(new_board, depth - 1, not is_maximizing)
+            flipped = self.engine.make_move(board, current_color, *move)
+            child_key = self.engine.zobrist_move(key, current_color, *move, flipped)
+            score = self._minimax(board, depth - 1, not is_maximizing, child_key, alpha, beta)
+            self.engine.undo_move(board, current_color, *move, flipped)
             
             if is_maximizing:
-                best_score = max(best_score, score)
+                if score > best_score:
+                    best_score, best_move = score, move
+                alpha = max(alpha, best_score)
             else:
-                best_score = min(best_score, score)
+                if score < best_score:
+                    best_score, best_move = score, move
+                beta = min(beta, best_score)
+            
+            # Prune: the other player will never let the game reach here
+            if alpha >= beta:
+                break
         
+        if best_score <= alpha_orig:
+            bound = UPPER
+        elif best_score >= beta_orig:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, bound, best_score, best_move)
         return best_score
     
     def _evaluate(self, board):
@@ -101,10 +240,5 @@ class MinimaxAgentRomain:
         Returns:
             A score representing how good the position is for the agent
         """
-        # Basic evaluation: difference in piece count
-        black_count, white_count = count_pieces(board)
-        
-        if self.color == 'B':
-            return black_count - white_count
-        else:
-            return white_count - black_count
+        # Pattern tables plus mobility and frontier
+        return self.evaluator.evaluate(board, self.color)
@@ -0,0 +1,144 @@
+"""
+Opening book.
+
+    python opening_book.py [--plies 4] [--depth 6] [--output opening_book.bin]
+
+The builder searches every position up to `plies` plies from the start
+with the alpha-beta MinimaxAgent. It writes one fixed-size record per
+position, sorted by Zobrist key (the keys come from a fixed seed, so they
+are the same in every process). Positions are stored in their canonical
+form (see symmetry.py), so the eight images of a position share a record:
+
+    header : b"OBK1", record count (uint32)
+    record : canonical key (uint64), square x * 8 + y on the canonical
+             board (uint8), search depth (uint8),
+             score for the side to move (int16), reserved (uint32)
+
+OpeningBook maps the file and binary-searches it in place. Nothing is
+parsed when the book is opened.
+"""
+
+import argparse
+import mmap
+import struct
+
+import bitboard
+from symmetry import canonical, canonical_key, from_canonical, transform_move, \
+    unique_moves
+
+MAGIC = b"OBK1"
+HEADER = struct.Struct("<4sI")
+RECORD = struct.Struct("<QBBhI")
+KEY = struct.Struct("<Q")
+DEFAULT_PATH = "opening_book.bin"
+
+
+class OpeningBook:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.data.close()
+            raise ValueError("%s is not an opening book" % path)
+
+    def __getstate__(self):
+        # The mapping is reopened from the path in the other process
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data.close()
+
+    def probe(self, key):
+        """(move, score, depth) stored for key, or None."""
+        data, lo, hi = self.data, 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found = KEY.unpack_from(data, HEADER.size + mid * RECORD.size)[0]
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                _, square, depth, score, _ = RECORD.unpack_from(data, HEADER.size + mid * RECORD.size)
+                return divmod(square, 8), score, depth
+        return None
+
+
+def book_move(board, color, engine, book, stats=None):
+    """
+    Book move for color in this position, or None if the position is not in
+    the book (or there is no book). Agents call this before searching.
+    """
+    if book is None:
+        return None
+    key, t = canonical_key(board, color)
+    entry = book.probe(key)
+    if entry is None:
+        return None
+    move, score, depth = entry
+    move = from_canonical(t, move)
+    if move not in engine.valid_moves(board, color):
+        return None  # key collision
+    if stats is not None:
+        stats.update(book=True, score=score, depth=depth)
+    return move
+
+
+def open_book(book):
+    """Agents accept a book or the path of a book file."""
+    return OpeningBook(book) if isinstance(book, str) else book
+
+
+def build(path=DEFAULT_PATH, plies=4, depth=6, verbose=False):
+    """Search every position up to `plies` plies deep and write the book."""
+    from minimax_ai import MinimaxAgent  # minimax_ai itself reads books
+    entries = {}
+    frontier = [(bitboard.create_board(), "B")]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for position, color in frontier:
+            bits, t = canonical(position)
+            key = bitboard.zobrist_hash(bits, color)
+            if key in entries:
+                continue  # transposition or symmetric position
+            moves = bitboard.valid_moves(position, color)
+            other = bitboard.opponent(color)
+            if not moves:
+                if bitboard.valid_moves(position, other):
+                    next_frontier.append((position, other))
+                continue
+            agent = MinimaxAgent(color, depth=depth, engine=bitboard, search="alphabeta")
+            x, y = transform_move(t, agent.get_move(list(position)))
+            entries[key] = (x * 8 + y, depth, agent.stats["score"])
+            if ply < plies:
+                for move in unique_moves(position, moves):
+                    child = list(position)
+                    bitboard.make_move(child, color, *move)
+                    next_frontier.append((child, other))
+        if verbose:
+            print("ply %d: %d positions" % (ply, len(entries)))
+        frontier = next_frontier
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for key in sorted(entries):
+            square, searched, score = entries[key]
+            f.write(RECORD.pack(key, square, searched, max(-32768, min(32767, score)), 0))
+    return len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the opening book")
+    parser.add_argument("--plies", type=int, default=4, help="plies from the start position")
+    parser.add_argument("--depth", type=int, default=6, help="search depth per position")
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    args = parser.parse_args()
+    print(build(args.output, args.plies, args.depth, verbose=True), "positions written")
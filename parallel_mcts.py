@@ -0,0 +1,147 @@
+"""
+Process parallelism for the MCTS agents: root parallelisation and
+pondering.
+
+Root parallelisation: every worker process grows its own tree from the
+same position with its own seed. The visit counts of the root children are
+then summed and the agent plays the most visited move, exactly as with a
+single tree.
+
+An agent opts in with a `workers` attribute, a `pool` attribute (created
+lazily here), a `root_visits(board, simulations, time_limit)` method, a
+`simulations_used` attribute set by its search and an `rng` attribute
+(its random.Random).
+
+Pondering: while the opponent thinks, a process of the agent's own grows a
+copy of the subtree of the move just played, and the agent grafts the grown
+subtree back once the opponent has moved. Running it in another process
+keeps it off the interpreter (and the GIL) the opponent's search runs in,
+and the agent's own seeded random source keeps it off the shared random
+stream. The agent needs `ponder_pool`, `ponder_signal` and `ponder_future`
+attributes (None to start with).
+"""
+
+import multiprocessing
+import pickle
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Values of the pondering signal shared with the pondering process
+RUN, STOP, ABORT = 0, 1, 2
+
+_signal = None  # pondering process side: the agent's signal
+
+
+def _search(agent, board, simulations, time_limit, seed):
+    agent.rng = random.Random(seed)
+    return agent.root_visits(board, simulations, time_limit), agent.simulations_used
+
+
+def split(simulations, workers):
+    """Share `simulations` between `workers` as evenly as possible."""
+    return [simulations // workers + (1 if i < simulations % workers else 0)
+            for i in range(workers)]
+
+
+def merged_root_visits(agent, board, simulations, time_limit=None):
+    """
+    Run `simulations` spread over the agent's workers (or let each worker
+    search for time_limit seconds), return {move: visits}. The simulations
+    actually run by all workers go to agent.simulations_used.
+    """
+    if agent.pool is None:
+        agent.pool = ProcessPoolExecutor(max_workers=agent.workers)
+    shares = [None] * agent.workers if simulations is None else split(simulations, agent.workers)
+    futures = [agent.pool.submit(_search, agent, board, n, time_limit, agent.rng.getrandbits(32))
+               for n in shares if n != 0]
+    merged = {}
+    agent.simulations_used = 0
+    for future in futures:
+        visits, used = future.result()
+        agent.simulations_used += used
+        for move, count in visits.items():
+            merged[move] = merged.get(move, 0) + count
+    return merged
+
+
+def _init_ponder(signal):
+    global _signal
+    _signal = signal
+
+
+def _ponder(payload, iterations, seed, method):
+    """
+    Pondering process side: run the agent's `method` (one MCTS iteration
+    from a node) on the pickled subtree, `iterations` times, or until STOP
+    when iterations is None. ABORT always stops.
+
+    Returns:
+        (grown subtree, iterations run, seconds)
+    """
+    agent, node = pickle.loads(payload)
+    agent.rng = random.Random(seed)
+    iterate = getattr(agent, method)
+    start = time.perf_counter()
+    done = 0
+    while iterations is None or done < iterations:
+        signal = _signal.value
+        if signal == ABORT or (signal == STOP and iterations is None):
+            break
+        iterate(node)
+        done += 1
+    return node, done, time.perf_counter() - start
+
+
+def start_pondering(agent, node, iterations, method):
+    """
+    Start growing node's subtree in the agent's pondering process (created
+    on first use). With a fixed number of iterations the result does not
+    depend on timing, so seeded games stay reproducible; with None the
+    process runs until finish_pondering.
+
+    Args:
+        agent: Agent pondering (see the module docstring)
+        node: Root of the subtree, sent without its parent
+        iterations: Iterations to run, or None to run until stopped
+        method: Name of the agent's method running one iteration from a node
+    """
+    finish_pondering(agent, abort=True)
+    if agent.ponder_pool is None:
+        agent.ponder_signal = multiprocessing.RawValue("b", RUN)
+        agent.ponder_pool = ProcessPoolExecutor(max_workers=1, initializer=_init_ponder,
+                                                initargs=(agent.ponder_signal,))
+    agent.ponder_signal.value = RUN
+    # Pickled now, detached from the rest of the tree (submit pickles later)
+    parent, node.parent = node.parent, None
+    try:
+        payload = pickle.dumps((agent, node))
+    finally:
+        node.parent = parent
+    agent.ponder_future = agent.ponder_pool.submit(_ponder, payload, iterations,
+                                                   agent.rng.getrandbits(32), method)
+
+
+def finish_pondering(agent, abort=False):
+    """
+    Stop pondering: once its fixed iterations are done, at once if it had
+    none, or at once and discarding the result with abort.
+
+    Returns:
+        (grown subtree, iterations run, seconds), or None
+    """
+    future = agent.ponder_future
+    if future is None:
+        return None
+    agent.ponder_future = None
+    agent.ponder_signal.value = ABORT if abort else STOP
+    result = future.result()
+    return None if abort else result
+
+
+def stop_pondering(agent):
+    """Abort pondering and shut the pondering process down (end of a game)."""
+    finish_pondering(agent, abort=True)
+    if agent.ponder_pool is not None:
+        agent.ponder_pool.shutdown()
+        agent.ponder_pool = None
@@ -0,0 +1,100 @@
+"""
+Root splitting for the minimax agents.
+
+The root moves of one search are shared between worker processes,
+"young brothers wait" style. The first (best ordered) move is searched
+alone with the full window. Its score becomes alpha, and every other move
+is then searched in parallel with a null window (alpha, alpha + 1). Only
+the moves that fail high are searched again with the full window. With
+search="minimax" there is no window to share, so all moves run in
+parallel straight away.
+
+An agent opts in with a `workers` attribute, a `pool` attribute (created
+lazily here) and a method search_root_move(board, move, depth, alpha,
+beta, time_limit). That method returns (score, nodes) from the agent's
+point of view, or None if time_limit ran out. Worker processes keep one
+transposition table per agent class and color from one task to the next.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+INF = float("inf")
+
+_tables = {}  # (class, color) -> transposition table, in each worker
+
+
+def _search_move(agent, board, move, depth, alpha, beta, time_limit):
+    table_key = (type(agent).__name__, agent.color)
+    agent.tt = _tables.setdefault(table_key, agent.tt)
+    return agent.search_root_move(board, move, depth, alpha, beta, time_limit)
+
+
+def _pool(agent):
+    if agent.pool is None:
+        agent.pool = ProcessPoolExecutor(max_workers=agent.workers)
+    return agent.pool
+
+
+def root_split(agent, board, moves, depth, time_limit=None, young_brothers_wait=True):
+    """
+    Search the root moves to `depth` on the agent's workers.
+
+    Args:
+        agent: Agent implementing search_root_move
+        board: Root position (agent.color to move)
+        moves: Root moves, best first
+        depth: Depth of the search, root move included
+        time_limit: Seconds available (None: no limit)
+        young_brothers_wait: Search the first move first and the others
+            with a null window (False for searches without pruning)
+
+    Returns:
+        ({move: score}, nodes), or None if the time ran out. Scores are exact
+        for the best move and upper bounds for the moves that failed low.
+    """
+    pool = _pool(agent)
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    nodes = 0
+    scores = {}
+
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+    def run(batch):
+        # batch: [(move, alpha, beta)] ; None if any of them timed out
+        nonlocal nodes
+        futures = [(move, pool.submit(_search_move, agent, board, move, depth, alpha, beta,
+                                      remaining()))
+                   for move, alpha, beta in batch]
+        results = {}
+        for move, future in futures:
+            result = future.result()
+            if result is None:
+                return None
+            results[move], searched = result
+            nodes += searched
+        return results
+
+    if not young_brothers_wait:
+        results = run([(move, -INF, INF) for move in moves])
+        return None if results is None else (results, nodes)
+
+    first = run([(moves[0], -INF, INF)])
+    if first is None:
+        return None
+    scores.update(first)
+    alpha = first[moves[0]]
+
+    probes = run([(move, alpha, alpha + 1) for move in moves[1:]])
+    if probes is None:
+        return None
+    scores.update(probes)
+
+    failed_high = [move for move in moves[1:] if probes[move] > alpha]
+    if failed_high:
+        exact = run([(move, alpha, INF) for move in failed_high])
+        if exact is None:
+            return None
+        scores.update(exact)
+    return scores, nodes
@@ -0,0 +1,211 @@
+"""
+Table-driven pattern evaluation.
+
+The board is cut into patterns (edges, 3x3 and 2x5 corners, diagonals).
+Each pattern reads its squares as a base-3 number (0 empty, 1 black,
+2 white) and looks the value up in the weight table of its family, shared
+by all the symmetric instances. Mobility and frontier terms are added.
+Scores are from black's point of view and negated for white.
+
+Without a weight file the tables reproduce the classic square-weight
+matrix, spread over the patterns covering each square. Tuned tables can
+be loaded with PatternEvaluator.load (see save for the JSON format).
+
+Indexes are not read square by square. For every row and every byte
+value of that row, a precomputed integer holds what the row adds to each
+pattern index, one 16-bit field per pattern instance. Summing the 8 row
+contributions of each colour gives all the indexes at once (fields never
+carry: an index is below 3^10 < 2^16), and struct unpacks them. Mobility
+is computed for both colours in one pass, each packed in its own lane of
+a wider integer.
+"""
+
+import json
+import struct
+from operator import getitem
+
+from bitboard import FULL, NOT_COL_0, NOT_COL_7, LANE, lane_masks, from_board
+
+# Classic positional weights used to build the default tables
+SQUARE_WEIGHTS = [
+    [100, -20, 10, 5, 5, 10, -20, 100],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [10, -2, 1, 1, 1, 1, -2, 10],
+    [5, -2, 1, 0, 0, 1, -2, 5],
+    [5, -2, 1, 0, 0, 1, -2, 5],
+    [10, -2, 1, 1, 1, 1, -2, 10],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [100, -20, 10, 5, 5, 10, -20, 100],
+]
+
+# Canonical instance of each family, as (x, y) squares in digit order
+FAMILIES = {
+    "edge": [(0, y) for y in range(8)],
+    "corner3x3": [(x, y) for x in range(3) for y in range(3)],
+    "corner2x5": [(x, y) for x in range(2) for y in range(5)],
+    "diag8": [(i, i) for i in range(8)],
+    "diag7": [(i, i + 1) for i in range(7)],
+    "diag6": [(i, i + 2) for i in range(6)],
+    "diag5": [(i, i + 3) for i in range(5)],
+    "diag4": [(i, i + 4) for i in range(4)],
+}
+
+SYMMETRIES = [
+    lambda x, y: (x, y), lambda x, y: (y, 7 - x),
+    lambda x, y: (7 - x, 7 - y), lambda x, y: (7 - y, x),
+    lambda x, y: (x, 7 - y), lambda x, y: (7 - x, y),
+    lambda x, y: (y, x), lambda x, y: (7 - y, 7 - x),
+]
+
+MOBILITY_WEIGHT = 5
+FRONTIER_WEIGHT = 3
+
+
+def _instances(squares):
+    """The distinct symmetric images of a pattern, as lists of square indices."""
+    seen, result = set(), []
+    for transform in SYMMETRIES:
+        image = [transform(x, y) for x, y in squares]
+        if frozenset(image) not in seen:
+            seen.add(frozenset(image))
+            result.append([x * 8 + y for x, y in image])
+    return result
+
+
+INSTANCES = {name: _instances(squares) for name, squares in FAMILIES.items()}
+INSTANCE_FAMILIES = [name for name, instances in INSTANCES.items() for _ in instances]
+
+FIELD_BITS = 16
+INDEXES = struct.Struct("<%dH" % len(INSTANCE_FAMILIES))
+
+
+def _row_contributions(digit):
+    """[row][byte]: packed index contributions of a row's discs of one colour."""
+    terms = [0] * 64  # square -> packed contribution of one disc on it
+    instances = [instance for family in INSTANCES.values() for instance in family]
+    for field, instance in enumerate(instances):
+        for i, sq in enumerate(instance):
+            terms[sq] += digit * 3 ** i << FIELD_BITS * field
+    rows = []
+    for x in range(8):
+        row = [0] * 256
+        for byte in range(1, 256):
+            low = (byte & -byte).bit_length() - 1
+            row[byte] = row[byte & (byte - 1)] + terms[x * 8 + low]
+        rows.append(row)
+    return rows
+
+
+BLACK_ROWS = _row_contributions(1)
+WHITE_ROWS = _row_contributions(2)
+
+
+def default_tables():
+    """Tables whose sum over all patterns is the square-weight evaluation."""
+    coverage = [0] * 64
+    for instances in INSTANCES.values():
+        for instance in instances:
+            for sq in instance:
+                coverage[sq] += 1
+
+    tables = {}
+    for name, instances in INSTANCES.items():
+        table = [0.0]
+        # Digit i has weight 3^i: append one square at a time
+        for sq in instances[0]:
+            share = SQUARE_WEIGHTS[sq >> 3][sq & 7] / coverage[sq]
+            table = [value + contribution
+                     for contribution in (0.0, share, -share) for value in table]
+        tables[name] = [round(value) for value in table]
+    return tables
+
+
+def near_empty(empty):
+    """Squares next to at least one empty square."""
+    near = (empty << 8 | empty >> 8) & FULL
+    side = ((empty << 1) & NOT_COL_0) | ((empty >> 1) & NOT_COL_7)
+    return near | side | (side << 8 & FULL) | (side >> 8)
+
+
+def frontier(discs, empty):
+    """Discs next to at least one empty square."""
+    return discs & near_empty(empty)
+
+
+_, LANE_LEFT, LANE_RIGHT = lane_masks(2)  # black's moves in lane 0, white's in lane 1
+
+
+def mobility(black, white):
+    """Legal moves of black minus legal moves of white (bitboard.moves_mask for both)."""
+    own = black | white << LANE
+    opp = white | black << LANE
+    empty = ~(black | white) & FULL
+    empty |= empty << LANE
+    moves = 0
+    for n, mask in LANE_LEFT:
+        m = opp & mask
+        x = (own << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        x |= (x << n) & m
+        moves |= (x << n) & mask & empty
+    for n, mask in LANE_RIGHT:
+        m = opp & mask
+        x = (own >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        x |= (x >> n) & m
+        moves |= (x >> n) & mask & empty
+    return (moves & FULL).bit_count() - (moves >> LANE).bit_count()
+
+
+class PatternEvaluator:
+    def __init__(self, tables=None, mobility_weight=MOBILITY_WEIGHT,
+                 frontier_weight=FRONTIER_WEIGHT):
+        self.tables = tables if tables is not None else default_tables()
+        self.mobility_weight = mobility_weight
+        self.frontier_weight = frontier_weight
+        # Table of every pattern instance, in INDEXES order
+        self.instance_tables = [self.tables[name] for name in INSTANCE_FAMILIES]
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        tables = {name: [int(round(w)) for w in table] for name, table in data["tables"].items()}
+        return cls(tables, data.get("mobility_weight", MOBILITY_WEIGHT),
+                   data.get("frontier_weight", FRONTIER_WEIGHT))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"mobility_weight": self.mobility_weight,
+                       "frontier_weight": self.frontier_weight,
+                       "tables": self.tables}, f)
+
+    def evaluate(self, board, color):
+        """Score of board (board.py or bitboard) for color."""
+        black, white = board if isinstance(board[0], int) else from_board(board)
+        packed = sum(map(getitem, BLACK_ROWS, black.to_bytes(8, "little"))) \
+            + sum(map(getitem, WHITE_ROWS, white.to_bytes(8, "little")))
+        indexes = INDEXES.unpack(packed.to_bytes(INDEXES.size, "little"))
+        score = sum(map(getitem, self.instance_tables, indexes))
+
+        near = near_empty(~(black | white) & FULL)
+        score += self.mobility_weight * mobility(black, white)
+        score -= self.frontier_weight * ((black & near).bit_count() - (white & near).bit_count())
+        return score if color == "B" else -score
+
+
+_default = None
+
+
+def default_evaluator():
+    """Shared evaluator with the default tables (built on first use)."""
+    global _default
+    if _default is None:
+        _default = PatternEvaluator()
+    return _default
@@ -1,12 +1,30 @@
 import random
-from board import valid_moves
+import board as board_engine
+from bitboard import SIDE, moves_mask, squares
+from instrument import record_stats
 
 class RandomAgent:
-    def __init__(self, color):
+    def __init__(self, color, engine=board_engine):
         self.color = color  # "B" ou "W"
+        self.engine = engine  # board ou bitboard
 
+    @record_stats
     def get_move(self, board):
-        moves = valid_moves(board, self.color)
+        moves = self.engine.valid_moves(board, self.color)
+        self.stats["moves"] = len(moves)
         if moves:
             return random.choice(moves)
         return None  # Aucun coup possible
+
+    @record_stats
+    def get_moves(self, boards):
+        # Un coup pour chaque plateau, en un seul appel (parties en parallèle)
+        if not boards or not isinstance(boards[0][0], int):
+            return [self.get_move(board) for board in boards]
+        me = SIDE[self.color]
+        moves = []
+        for board in boards:
+            mask = moves_mask(board[me], board[1 - me])
+            moves.append(random.choice(squares(mask)) if mask else None)
+        self.stats["boards"] = len(boards)
+        return moves
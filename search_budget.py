@@ -0,0 +1,58 @@
+"""
+Budget of one MCTS search: a number of simulations, a wall-clock time
+limit, or both.
+
+The search calls running() before each simulation. With a simulation
+budget, running() also stops the search once the runner-up root child
+cannot catch the most visited one, even if every remaining simulation
+went to it (the move played is the most visited one, so it could not
+change any more).
+"""
+
+import time
+
+CHECK_EVERY = 16  # simulations between two early-stop checks
+
+
+class SearchBudget:
+    def __init__(self, simulations=None, time_limit=None, early_stop=True, visits_per_simulation=1):
+        """
+        Args:
+            simulations: Maximum number of simulations (None: only the time limit)
+            time_limit: Seconds available (None: only the simulation count)
+            early_stop: Stop when the most visited root child can no longer change
+            visits_per_simulation: Visits added by one simulation (batched playouts)
+        """
+        if simulations is None and time_limit is None:
+            raise ValueError("a search needs a simulation count or a time limit")
+        self.simulations = simulations
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.early_stop = early_stop and simulations is not None
+        self.visits_per_simulation = visits_per_simulation
+        self.used = 0
+        self.stopped_early = False
+
+    def running(self, child_visits):
+        """
+        True if one more simulation fits in the budget (and count it).
+        child_visits() returns the visit counts of the root children; it is
+        only called every CHECK_EVERY simulations.
+        """
+        if self.simulations is not None and self.used >= self.simulations:
+            return False
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return False
+        if self.early_stop and self.used and self.used % CHECK_EVERY == 0 \
+                and self.decided(child_visits()):
+            self.stopped_early = True
+            return False
+        self.used += 1
+        return True
+
+    def decided(self, visits):
+        if not visits:
+            return False
+        visits = sorted(visits, reverse=True)
+        runner_up = visits[1] if len(visits) > 1 else 0
+        remaining = (self.simulations - self.used) * self.visits_per_simulation
+        return visits[0] - runner_up > remaining
@@ -0,0 +1,131 @@
+"""
+Self-play data generation.
+
+    python selfplay.py games.bin --black mcts --white greedy --games 1000
+
+Games are played in worker processes (as in main.iter_games) and every
+finished game is appended to a binary file:
+
+    file header : b"OGR1"
+    game        : black agent id, white agent id (uint8), seed (uint32),
+                  black discs, white discs, number of moves (uint8),
+                  then one byte per move (square x * 8 + y)
+
+Agent ids index AGENT_IDS. Passes are not stored: replaying a game, a
+side without a legal move passes. Records are buffered and written in
+batches. read_games and positions are generators, so a file is never
+loaded whole.
+"""
+
+import argparse
+import os
+import random
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import bitboard
+from main import AGENTS, ENGINES, play_game
+
+MAGIC = b"OGR1"
+GAME = struct.Struct("<BBIBBB")
+AGENT_IDS = ("random", "greedy", "minimax", "minimax_romain", "mcts", "mcts_romain")
+
+GameRecord = namedtuple("GameRecord", "black white seed black_score white_score moves")
+
+
+def encode(black, white, seed, black_score, white_score, moves):
+    """Bytes of one game record; moves is a list of (x, y)."""
+    return GAME.pack(AGENT_IDS.index(black), AGENT_IDS.index(white), seed,
+                     black_score, white_score, len(moves)) \
+        + bytes(x * 8 + y for x, y in moves)
+
+
+def play_record(spec_black, spec_white, seed, engine="bitboard"):
+    """Play one seeded game and return its record bytes. Specs are (name, kwargs)."""
+    random.seed(seed)
+    engine = ENGINES[engine]
+    black = AGENTS[spec_black[0]]("B", engine=engine, **spec_black[1])
+    white = AGENTS[spec_white[0]]("W", engine=engine, **spec_white[1])
+    plies = []
+    black_score, white_score = play_game(black, white, engine=engine, stats=plies)
+    for agent in (black, white):
+        if hasattr(agent, "close"):
+            agent.close()
+    moves = [ply["move"] for ply in plies if ply["move"]]
+    return encode(spec_black[0], spec_white[0], seed, black_score, white_score, moves)
+
+
+def generate(path, spec_a=("mcts", {}), spec_b=None, n_games=100, workers=None, seed=0,
+             engine="bitboard", batch_size=256):
+    """
+    Append n_games games to path. spec_b defaults to spec_a (self-play);
+    with two specs, A plays black in even games. At most a few games per
+    worker are in flight, and records are written batch_size at a time.
+    """
+    spec_b = spec_b or spec_a
+    rng = random.Random(seed)
+    buffer = []
+
+    with open(path, "ab") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        if f.tell() == 0:
+            f.write(MAGIC)
+        window = 4 * (workers or os.cpu_count() or 1)
+        pending = set()
+        submitted = 0
+        while submitted < n_games or pending:
+            while submitted < n_games and len(pending) < window:
+                black, white = (spec_a, spec_b) if submitted % 2 == 0 else (spec_b, spec_a)
+                pending.add(pool.submit(play_record, black, white, rng.getrandbits(32), engine))
+                submitted += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            buffer.extend(future.result() for future in done)
+            if len(buffer) >= batch_size:
+                f.write(b"".join(buffer))
+                f.flush()
+                buffer = []
+        f.write(b"".join(buffer))
+    return n_games
+
+
+def read_games(path):
+    """Yield the GameRecord of every game in the file, one at a time."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a game record file" % path)
+        while True:
+            header = f.read(GAME.size)
+            if len(header) < GAME.size:
+                return
+            black, white, seed, black_score, white_score, n_moves = GAME.unpack(header)
+            moves = f.read(n_moves)
+            yield GameRecord(AGENT_IDS[black], AGENT_IDS[white], seed,
+                             black_score, white_score, [divmod(sq, 8) for sq in moves])
+
+
+def positions(record, engine=bitboard):
+    """
+    Replay a game: yield (board, color to move, move played) before each
+    move. The board is the live replay board, copy it to keep it.
+    """
+    board = engine.create_board()
+    color = "B"
+    for move in record.moves:
+        if move not in engine.valid_moves(board, color):
+            color = engine.opponent(color)  # the other side had to pass
+        yield board, color, move
+        engine.make_move(board, color, *move)
+        color = engine.opponent(color)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append self-play games to a record file")
+    parser.add_argument("path")
+    parser.add_argument("--black", default="mcts", choices=AGENT_IDS)
+    parser.add_argument("--white", default=None, choices=AGENT_IDS)
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    spec_b = (args.white, {}) if args.white else None
+    generate(args.path, (args.black, {}), spec_b, args.games, args.workers, args.seed)
@@ -0,0 +1,261 @@
+"""
+Asyncio game server: many human-vs-agent games at once.
+
+    python server.py [--host 127.0.0.1] [--port 8765] [--workers 4]
+
+Clients talk newline-delimited JSON over TCP, one request per line and
+one response per request:
+
+    {"cmd": "new", "agent": "mcts", "kwargs": {"simulations": 300}, "color": "B"}
+    {"cmd": "move", "session": 1, "move": [2, 3]}
+    {"cmd": "state", "session": 1}
+    {"cmd": "metrics"}                     (or with "session" for one game)
+    {"cmd": "close", "session": 1}
+
+"color" is the human's color; the agent replies inside the same "move"
+(or "new") request, passing for either side as needed. Errors come back
+as {"error": "..."}. If the agent itself fails, the game state comes back
+with the error and the game stays on the agent's turn; a "move" request
+without a move then retries the agent. Searching agents (minimax, MCTS)
+run in a bounded process pool, so a long search never blocks the other
+sessions; at most max_pending agent calls are queued at any time.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from main import AGENTS, ENGINES
+
+INLINE_AGENTS = ("random", "greedy")  # cheap enough to run in the event loop
+
+
+def _agent_move(name, kwargs, color, engine_name, board):
+    """Worker side: build the agent and return (move, stats, start time)."""
+    started = time.time()
+    agent = AGENTS[name](color, engine=ENGINES[engine_name], **kwargs)
+    move = agent.get_move(board)
+    if hasattr(agent, "close"):
+        agent.close()
+    return move, agent.stats, started
+
+
+class GameSession:
+    def __init__(self, session_id, agent, kwargs, human_color, engine_name="bitboard"):
+        """Raises whatever the agent's constructor raises on bad kwargs."""
+        self.id = session_id
+        self.agent = agent
+        self.kwargs = kwargs
+        self.human = human_color
+        self.ai = "W" if human_color == "B" else "B"
+        # Built once here so that bad kwargs fail now; cheap agents play with it
+        self.player = AGENTS[agent](self.ai, engine=ENGINES[engine_name], **kwargs)
+        self.engine_name = engine_name
+        self.engine = ENGINES[engine_name]
+        self.board = self.engine.create_board()
+        self.to_move = "B"
+        self.over = False
+        self.lock = asyncio.Lock()  # one request at a time per game
+        # Metrics of the agent calls
+        self.ai_moves = 0
+        self.latencies = []
+        self.queue_waits = []
+        self.pending = 0
+
+    def legal(self, color=None):
+        return self.engine.valid_moves(self.board, color or self.to_move)
+
+    def advance(self):
+        """Pass for the side to move while it has no move; detect the end."""
+        if self.legal():
+            return
+        other = self.engine.opponent(self.to_move)
+        if self.legal(other):
+            self.to_move = other
+        else:
+            self.over = True
+
+    def play(self, color, move):
+        self.engine.make_move(self.board, color, *move)
+        self.to_move = self.engine.opponent(color)
+        self.advance()
+
+    def state(self):
+        rows = self.board if not isinstance(self.board[0], int) else self.engine.to_board(self.board)
+        black, white = self.engine.count_pieces(self.board)
+        return {"session": self.id, "board": ["".join(row) for row in rows],
+                "to_move": None if self.over else self.to_move,
+                "legal": [] if self.over or self.to_move != self.human else self.legal(),
+                "over": self.over, "score": {"B": black, "W": white}}
+
+    def close(self):
+        if hasattr(self.player, "close"):
+            self.player.close()
+
+    def metrics(self):
+        latencies = self.latencies
+        return {"session": self.id, "agent": self.agent, "ai_moves": self.ai_moves,
+                "pending": self.pending,
+                "latency_mean": sum(latencies) / len(latencies) if latencies else None,
+                "latency_max": max(latencies, default=None),
+                "latency_last": latencies[-1] if latencies else None,
+                "queue_wait_mean": sum(self.queue_waits) / len(self.queue_waits)
+                if self.queue_waits else None}
+
+
+class GameServer:
+    def __init__(self, workers=None, max_pending=None):
+        """
+        Args:
+            workers: Processes for the agent searches (None: one per CPU)
+            max_pending: Agent calls queued or running at once (None: 4 per worker)
+        """
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.slots = asyncio.Semaphore(max_pending or 4 * (workers or 4))
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.pool.shutdown(cancel_futures=True)
+
+    async def agent_move(self, session):
+        """The agent's move in session (in the pool unless the agent is cheap)."""
+        submitted = time.time()
+        session.pending += 1
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            if session.agent in INLINE_AGENTS:
+                started = time.time()
+                move = session.player.get_move(session.board)
+            else:
+                async with self.slots:
+                    move, _, started = await asyncio.get_running_loop().run_in_executor(
+                        self.pool, _agent_move, session.agent, session.kwargs, session.ai,
+                        session.engine_name, session.board)
+        finally:
+            session.pending -= 1
+            self.queue_depth -= 1
+        session.ai_moves += 1
+        session.latencies.append(time.time() - submitted)
+        session.queue_waits.append(max(0.0, started - submitted))
+        if move is None or tuple(move) not in session.legal():
+            raise ValueError("agent played an illegal move %r" % (move,))
+        return tuple(move)
+
+    async def agent_turns(self, session):
+        """
+        Let the agent play until it is the human's turn or the game is over.
+
+        Returns:
+            The response: the game state with the agent's moves, plus the
+            error if the agent failed (the game then stays on its turn)
+        """
+        moves = []
+        try:
+            while not session.over and session.to_move == session.ai:
+                move = await self.agent_move(session)
+                session.play(session.ai, move)
+                moves.append(move)
+        except Exception as error:
+            return dict(session.state(), ai_moves=moves,
+                        error="agent failed: %s: %s" % (type(error).__name__, error))
+        return dict(session.state(), ai_moves=moves)
+
+    async def handle(self, request):
+        if not isinstance(request, dict):
+            return {"error": "a request must be a JSON object"}
+        cmd = request.get("cmd")
+        if cmd == "new":
+            agent = request.get("agent", "mcts")
+            if agent not in AGENTS:
+                return {"error": "unknown agent %r" % (agent,)}
+            engine = request.get("engine", "bitboard")
+            if engine not in ENGINES:
+                return {"error": "unknown engine %r" % (engine,)}
+            color = request.get("color", "B")
+            if color not in ("B", "W"):
+                return {"error": "color must be 'B' or 'W'"}
+            kwargs = request.get("kwargs", {})
+            if not isinstance(kwargs, dict):
+                return {"error": "kwargs must be a JSON object"}
+            try:
+                session = GameSession(next(self.ids), agent, kwargs, color, engine)
+            except Exception as error:
+                return {"error": "bad agent %r: %s: %s" % (agent, type(error).__name__, error)}
+            self.sessions[session.id] = session
+            async with session.lock:
+                return await self.agent_turns(session)
+        if cmd == "metrics" and "session" not in request:
+            return {"sessions": len(self.sessions), "queue_depth": self.queue_depth,
+                    "max_queue_depth": self.max_queue_depth,
+                    "per_session": [s.metrics() for s in self.sessions.values()]}
+
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            return {"error": "unknown session"}
+        if cmd == "state":
+            return session.state()
+        if cmd == "metrics":
+            return session.metrics()
+        if cmd == "close":
+            del self.sessions[session.id]
+            session.close()
+            return {"session": session.id, "closed": True}
+        if cmd == "move":
+            async with session.lock:
+                if session.over:
+                    return {"error": "game over"}
+                if session.to_move == session.ai:
+                    # The agent failed earlier: try its turn again
+                    return await self.agent_turns(session)
+                move = tuple(request.get("move") or ())
+                if move not in session.legal():
+                    return {"error": "illegal move %r" % (list(move),)}
+                session.play(session.human, move)
+                return await self.agent_turns(session)
+        return {"error": "unknown command %r" % cmd}
+
+    async def client(self, reader, writer):
+        # Requests of one connection are answered in order
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle(json.loads(line))
+                except (ValueError, TypeError) as error:
+                    response = {"error": str(error)}
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, workers=None):
+    server = GameServer(workers)
+    listener = await asyncio.start_server(server.client, host, port)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Othello game server (JSON lines over TCP)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers))
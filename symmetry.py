@@ -0,0 +1,131 @@
+"""
+The eight symmetries of the board.
+
+Transform t (0..7) maps a square (x, y) by transposing it first if t & 4
+(x, y -> y, x), then flipping the rows if t & 2 (x -> 7 - x), then
+mirroring the columns if t & 1 (y -> 7 - y). Squares go through
+precomputed permutation tables. Bitboards use the usual bit tricks: a
+byte swap for the rows, a bit reversal inside each byte for the columns,
+and three delta swaps for the transposition.
+
+The canonical form of a position is its smallest image, comparing
+(black, white) bitboards. canonical() also returns the transform used, so
+moves found on the canonical board can be mapped back with from_canonical.
+"""
+
+import bitboard
+
+IDENTITY = 0
+
+
+def _map(t, x, y):
+    if t & 4:
+        x, y = y, x
+    if t & 2:
+        x = 7 - x
+    if t & 1:
+        y = 7 - y
+    return x, y
+
+
+# SQUARE_MAP[t][sq]: image of square sq = x * 8 + y under transform t
+SQUARE_MAP = [[_map(t, sq >> 3, sq & 7)[0] * 8 + _map(t, sq >> 3, sq & 7)[1]
+               for sq in range(64)] for t in range(8)]
+INVERSE = [next(u for u in range(8) if all(SQUARE_MAP[u][SQUARE_MAP[t][sq]] == sq
+                                           for sq in range(64)))
+           for t in range(8)]
+
+
+def _flip_rows(b):
+    return int.from_bytes(b.to_bytes(8, "little"), "big")
+
+
+def _mirror_columns(b):
+    b = ((b >> 1) & 0x5555555555555555) | ((b & 0x5555555555555555) << 1)
+    b = ((b >> 2) & 0x3333333333333333) | ((b & 0x3333333333333333) << 2)
+    return ((b >> 4) & 0x0F0F0F0F0F0F0F0F) | ((b & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def _transpose(b):
+    t = 0x0F0F0F0F00000000 & (b ^ (b << 28))
+    b ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (b ^ (b << 14))
+    b ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (b ^ (b << 7))
+    return b ^ t ^ (t >> 7)
+
+
+def transform_bits(b, t):
+    """Image of the bitboard b under transform t."""
+    if t & 4:
+        b = _transpose(b)
+    if t & 2:
+        b = _flip_rows(b)
+    if t & 1:
+        b = _mirror_columns(b)
+    return b
+
+
+def transform_move(t, move):
+    """Image of the square move = (x, y) under transform t."""
+    sq = SQUARE_MAP[t][move[0] * 8 + move[1]]
+    return sq >> 3, sq & 7
+
+
+def transform_board(board, t):
+    """Image of a board (either engine, same representation) under transform t."""
+    if isinstance(board[0], int):
+        return [transform_bits(board[0], t), transform_bits(board[1], t)]
+    image = [row[:] for row in board]
+    for sq, target in enumerate(SQUARE_MAP[t]):
+        image[target >> 3][target & 7] = board[sq >> 3][sq & 7]
+    return image
+
+
+def canonical(board):
+    """
+    (canonical board, t) where canonical board = transform_board(board, t).
+    The canonical board is a bitboard whatever the input engine.
+    """
+    black, white = board if isinstance(board[0], int) else bitboard.from_board(board)
+    best, best_t = (black, white), IDENTITY
+    for t in range(1, 8):
+        image = (transform_bits(black, t), transform_bits(white, t))
+        if image < best:
+            best, best_t = image, t
+    return list(best), best_t
+
+
+def canonical_key(board, color):
+    """Zobrist key of the canonical form (the same for all eight images) and t."""
+    bits, t = canonical(board)
+    return bitboard.zobrist_hash(bits, color), t
+
+
+def from_canonical(t, move):
+    """Move on the original board for a move on its canonical form."""
+    return transform_move(INVERSE[t], move)
+
+
+def symmetries(board):
+    """Transforms other than the identity that leave the position unchanged."""
+    black, white = board if isinstance(board[0], int) else bitboard.from_board(board)
+    return [t for t in range(1, 8)
+            if transform_bits(black, t) == black and transform_bits(white, t) == white]
+
+
+def unique_moves(board, moves):
+    """
+    One move per class of moves that are images of each other under a
+    symmetry of the position (for the start position, 1 move instead of 4).
+    Moves keep their original order.
+    """
+    own = symmetries(board)
+    if not own:
+        return moves
+    seen, result = set(), []
+    for move in moves:
+        if move not in seen:
+            result.append(move)
+            seen.update(transform_move(t, move) for t in own)
+    return result
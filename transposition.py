@@ -0,0 +1,66 @@
+"""
+Fixed-size transposition table shared by the minimax searches.
+
+Positions are identified by their Zobrist key (see board.zobrist_hash).
+Each bucket holds two entries: a depth-preferred slot, only overwritten by
+a search at least as deep, and an always-replace slot for everything else.
+"""
+
+import sys
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    def __init__(self, size=1 << 16):
+        """
+        Args:
+            size: Number of buckets, rounded up to a power of two
+        """
+        self.buckets = 1 << max(0, (size - 1).bit_length())
+        self.mask = self.buckets - 1
+        self.slots = [None] * (2 * self.buckets)
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def probe(self, key):
+        """Return the entry (key, depth, bound, score, move) for key, or None."""
+        self.probes += 1
+        i = (key & self.mask) << 1
+        entry = self.slots[i]
+        if entry is None or entry[0] != key:
+            entry = self.slots[i + 1]
+            if entry is None or entry[0] != key:
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, bound, score, move):
+        self.stores += 1
+        i = (key & self.mask) << 1
+        entry = (key, depth, bound, score, move)
+        current = self.slots[i]
+        if current is None or current[0] == key or depth >= current[1]:
+            self.slots[i] = entry
+        else:
+            self.slots[i + 1] = entry
+
+    def clear(self):
+        self.slots = [None] * (2 * self.buckets)
+        self.probes = self.hits = self.stores = 0
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def memory_bytes(self):
+        """Approximate memory used by the slot array and the stored entries."""
+        total = sys.getsizeof(self.slots)
+        for entry in self.slots:
+            if entry is not None:
+                total += sys.getsizeof(entry) + sum(sys.getsizeof(field) for field in entry[:4])
+        return total
+
+    def stats(self):
+        return {"probes": self.probes, "hits": self.hits, "hit_rate": self.hit_rate(),
+                "stores": self.stores, "memory_bytes": self.memory_bytes()}